@@ -2,14 +2,10 @@
 """
 
 import click
-import tomlkit
 import subprocess
 import re
-import csv
 import sys
 import os
-from concurrent import futures
-import glob
 
 __version__ = '1.0.0'
 
@@ -83,6 +79,12 @@ def get_result(strings, extract_re):
 def brench(config_path, files, jobs):
     """Run a batch of benchmarks and emit a CSV of results.
     """
+    # These are imported here so `brench --help` starts quickly.
+    import tomlkit
+    import csv
+    import glob
+    from concurrent import futures
+
     with open(config_path) as f:
         config = tomlkit.loads(f.read())
 
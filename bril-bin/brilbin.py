@@ -0,0 +1,428 @@
+"""A compact binary format for Bril.
+
+This module defines an encoding of Bril programs that is much smaller
+than the JSON representation and can be read without a JSON parser:
+every name is stored once in a string table, and every instruction is a
+fixed-width record that refers to names by index. There are two
+commands: `bril2bin`, which converts a JSON program into the binary
+format, and `bin2bril`, which converts it back.
+
+A file consists of a header and five sections, each aligned to 8 bytes.
+All integers are little-endian.
+
+- The header (`HEADER`) holds the magic number, the format version, and
+  the count and byte offset of each section.
+- The string offsets are `n_strings + 1` `uint32`s: the start of each
+  string in the string data, and then the end of the string data.
+- The string data is the UTF-8 text of all the strings, each followed
+  by a NUL byte.
+- The functions are fixed-width `FUNC` records.
+- The instructions (and labels) of all functions, in order, are
+  fixed-width `INSTR` records.
+- The operands are `uint32` string indices. Each instruction's `args`,
+  `funcs`, and `labels` are contiguous, followed by the 64-bit value of
+  a constant as two words (low word first); a function's arguments are
+  (name, type) pairs.
+
+Types are stored as strings in the text format's syntax, like
+`ptr<int>`.
+"""
+
+import json
+import mmap
+import struct
+import sys
+
+__version__ = '0.0.1'
+
+MAGIC = b'BRLB'
+VERSION = 1
+
+# Magic, version, and (count, offset) pairs for the string offsets, the
+# functions, the instructions, and the operands, and the offset of the
+# string data.
+HEADER = struct.Struct('<4sHxx IQ IQ IQ IQ Q')
+
+# Flags, name, type, offset of the arguments in the operands, argument
+# count, index of the first instruction, instruction count.
+FUNC = struct.Struct('<BxxxIIIIII')
+
+# Kind, flags, operand counts (args, funcs, labels), opcode, destination
+# (or label name), type, and operand offset.
+INSTR = struct.Struct('<BBHHHIIII')
+
+# The most args, funcs, or labels an instruction can have.
+MAX_OPERANDS = 0xffff
+
+# Constants are stored as the bits of a 64-bit integer or a double.
+_INT_BITS = struct.Struct('<q')
+_UINT_BITS = struct.Struct('<Q')
+_FLOAT_BITS = struct.Struct('<d')
+
+# Marks a missing string (a `void` function type, for example).
+NONE = 0xffffffff
+
+# Instruction kinds.
+KIND_LABEL = 0
+KIND_INSTR = 1
+
+# Flags on functions and instructions, recording which keys are present.
+HAS_DEST = 1 << 0
+HAS_TYPE = 1 << 1
+HAS_VALUE = 1 << 2
+HAS_ARGS = 1 << 3
+HAS_FUNCS = 1 << 4
+HAS_LABELS = 1 << 5
+VALUE_BOOL = 1 << 6
+VALUE_FLOAT = 1 << 7
+
+INSTR_KEYS = {'op', 'dest', 'type', 'args', 'funcs', 'labels', 'value'}
+LABEL_KEYS = {'label'}
+FUNC_KEYS = {'name', 'args', 'type', 'instrs'}
+ARG_KEYS = {'name', 'type'}
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _check_keys(obj, keys, what):
+    """Raise a ValueError if a JSON object has keys that the format
+    cannot store.
+    """
+    extra = set(obj) - keys
+    if extra:
+        raise ValueError('unsupported {} fields: {}'.format(
+            what, ', '.join(sorted(extra))
+        ))
+
+
+# Types.
+
+def type_to_str(typ):
+    if isinstance(typ, dict):
+        if len(typ) != 1:
+            raise ValueError('invalid type {!r}'.format(typ))
+        key, value = next(iter(typ.items()))
+        return '{}<{}>'.format(key, type_to_str(value))
+    else:
+        return typ
+
+
+def str_to_type(s):
+    if s.endswith('>'):
+        key, rest = s.split('<', 1)
+        return {key: str_to_type(rest[:-1])}
+    else:
+        return s
+
+
+# Encoding.
+
+class StringTable:
+    """Intern strings as dense indices.
+    """
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def __call__(self, s):
+        try:
+            return self.index[s]
+        except KeyError:
+            i = self.index[s] = len(self.strings)
+            self.strings.append(s)
+            return i
+
+
+def encode(prog):
+    """Encode a Bril program (as JSON-like data) in the binary format.
+    Return a `bytes` object.
+    """
+    strtab = StringTable()
+    funcs = bytearray()
+    instrs = bytearray()
+    operands = []
+    n_instrs = 0
+
+    for func in prog['functions']:
+        _check_keys(func, FUNC_KEYS, 'function')
+
+        args_off = len(operands)
+        for arg in func.get('args', []):
+            _check_keys(arg, ARG_KEYS, 'argument')
+            operands.append(strtab(arg['name']))
+            operands.append(strtab(type_to_str(arg['type'])))
+
+        funcs += FUNC.pack(
+            HAS_ARGS if 'args' in func else 0,
+            strtab(func['name']),
+            strtab(type_to_str(func['type'])) if 'type' in func else NONE,
+            args_off,
+            len(func.get('args', [])),
+            n_instrs,
+            len(func['instrs']),
+        )
+
+        for instr in func['instrs']:
+            n_instrs += 1
+            if 'label' in instr:
+                _check_keys(instr, LABEL_KEYS, 'label')
+                instrs += INSTR.pack(KIND_LABEL, 0, 0, 0, 0, NONE,
+                                     strtab(instr['label']), NONE, 0)
+                continue
+
+            _check_keys(instr, INSTR_KEYS, 'instruction')
+
+            flags = 0
+            dest = typ = NONE
+            if 'dest' in instr:
+                flags |= HAS_DEST
+                dest = strtab(instr['dest'])
+            if 'type' in instr:
+                flags |= HAS_TYPE
+                typ = strtab(type_to_str(instr['type']))
+
+            operands_off = len(operands)
+            args = instr.get('args', ())
+            funcs_ = instr.get('funcs', ())
+            labels = instr.get('labels', ())
+            for key, flag, names in (('args', HAS_ARGS, args),
+                                     ('funcs', HAS_FUNCS, funcs_),
+                                     ('labels', HAS_LABELS, labels)):
+                if len(names) > MAX_OPERANDS:
+                    raise ValueError(
+                        'too many {} in a {} instruction: {} (at most {})'
+                        .format(key, instr['op'], len(names), MAX_OPERANDS)
+                    )
+                if key in instr:
+                    flags |= flag
+                    operands += map(strtab, names)
+
+            if 'value' in instr:
+                flags |= HAS_VALUE
+                value = instr['value']
+                if isinstance(value, bool):
+                    flags |= VALUE_BOOL
+                    bits = int(value)
+                elif isinstance(value, float):
+                    flags |= VALUE_FLOAT
+                    bits, = _UINT_BITS.unpack(_FLOAT_BITS.pack(value))
+                elif isinstance(value, int):
+                    bits, = _UINT_BITS.unpack(_INT_BITS.pack(value))
+                else:
+                    raise ValueError('unsupported constant {!r}'.format(value))
+                operands += (bits & 0xffffffff, bits >> 32)
+
+            instrs += INSTR.pack(
+                KIND_INSTR, flags, len(args), len(funcs_), len(labels),
+                strtab(instr['op']), dest, typ, operands_off,
+            )
+
+    # Lay out the string table.
+    data = bytearray()
+    offsets = []
+    for s in strtab.strings:
+        offsets.append(len(data))
+        data += s.encode('utf8')
+        data += b'\0'
+    offsets.append(len(data))
+
+    # Lay out the sections.
+    out = bytearray(HEADER.size)
+    sections = []
+    for section in (struct.pack('<{}I'.format(len(offsets)), *offsets),
+                    funcs, instrs,
+                    struct.pack('<{}I'.format(len(operands)), *operands),
+                    data):
+        out += bytes(_align(len(out)) - len(out))
+        sections.append(len(out))
+        out += section
+
+    HEADER.pack_into(
+        out, 0, MAGIC, VERSION,
+        len(strtab.strings), sections[0],
+        len(prog['functions']), sections[1],
+        n_instrs, sections[2],
+        len(operands), sections[3],
+        sections[4],
+    )
+    return bytes(out)
+
+
+# Decoding.
+
+def _uint32s(view):
+    """Interpret a buffer as an array of little-endian `uint32`s, without
+    copying it if possible.
+    """
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    else:
+        return struct.unpack('<{}I'.format(len(view) // 4), view)
+
+
+class BinaryProgram:
+    """A read-only view of a program in the binary format.
+
+    The underlying buffer (for example, a memory-mapped file) is only
+    read as needed: `function(i)` decodes just one function. Use
+    `to_json()` to decode the whole program.
+    """
+
+    def __init__(self, buf):
+        self.buf = memoryview(buf)
+        (magic, version,
+         self.n_strings, strings_off,
+         self.n_funcs, self.funcs_off,
+         self.n_instrs, self.instrs_off,
+         n_operands, operands_off,
+         self.data_off) = HEADER.unpack_from(self.buf)
+        if magic != MAGIC:
+            raise ValueError('not a binary Bril file')
+        if version != VERSION:
+            raise ValueError('unsupported binary Bril version {}'.format(
+                version
+            ))
+
+        self.string_offsets = _uint32s(
+            self.buf[strings_off:strings_off + 4 * (self.n_strings + 1)]
+        )
+        self.operands = _uint32s(
+            self.buf[operands_off:operands_off + 4 * n_operands]
+        )
+        self._strings = None
+
+    @property
+    def strings(self):
+        """The string table, as a list.
+        """
+        if self._strings is None:
+            # Decode all the strings at once, dropping the last NUL.
+            end = self.data_off + self.string_offsets[self.n_strings] - 1
+            data = bytes(self.buf[self.data_off:end])
+            self._strings = data.decode('utf8').split('\0') \
+                if self.n_strings else []
+        return self._strings
+
+    def string(self, i):
+        """Look up a single string, without decoding the whole table.
+        """
+        if self._strings is not None:
+            return self._strings[i]
+        start = self.data_off + self.string_offsets[i]
+        end = self.data_off + self.string_offsets[i + 1] - 1
+        return str(self.buf[start:end], 'utf8')
+
+    def _type(self, i):
+        s = self.strings[i]
+        return str_to_type(s) if s.endswith('>') else s
+
+    def function_name(self, i):
+        _, name, *_ = FUNC.unpack_from(self.buf,
+                                       self.funcs_off + FUNC.size * i)
+        return self.string(name)
+
+    def function(self, i):
+        """Decode the `i`th function as JSON-like data.
+        """
+        strings = self.strings
+        operands = self.operands
+        (flags, name, typ, args_off, n_args,
+         start, n_instrs) = FUNC.unpack_from(
+            self.buf, self.funcs_off + FUNC.size * i
+        )
+
+        func = {'name': strings[name]}
+        if flags & HAS_ARGS:
+            func['args'] = [
+                {'name': strings[operands[j]],
+                 'type': self._type(operands[j + 1])}
+                for j in range(args_off, args_off + 2 * n_args, 2)
+            ]
+        if typ != NONE:
+            func['type'] = self._type(typ)
+
+        begin = self.instrs_off + INSTR.size * start
+        records = self.buf[begin:begin + INSTR.size * n_instrs]
+        instrs = func['instrs'] = []
+        for (kind, flags, n_args, n_funcs, n_labels,
+             op, dest, typ, off) in INSTR.iter_unpack(records):
+            if kind == KIND_LABEL:
+                instrs.append({'label': strings[dest]})
+                continue
+
+            instr = {'op': strings[op]}
+            if flags & HAS_DEST:
+                instr['dest'] = strings[dest]
+            if flags & HAS_TYPE:
+                instr['type'] = self._type(typ)
+            if flags & HAS_ARGS:
+                instr['args'] = [strings[a]
+                                 for a in operands[off:off + n_args]]
+                off += n_args
+            if flags & HAS_FUNCS:
+                instr['funcs'] = [strings[f]
+                                  for f in operands[off:off + n_funcs]]
+                off += n_funcs
+            if flags & HAS_LABELS:
+                instr['labels'] = [strings[lb]
+                                   for lb in operands[off:off + n_labels]]
+                off += n_labels
+            if flags & HAS_VALUE:
+                bits = operands[off] | operands[off + 1] << 32
+                if flags & VALUE_BOOL:
+                    value = bool(bits)
+                elif flags & VALUE_FLOAT:
+                    value, = _FLOAT_BITS.unpack(_UINT_BITS.pack(bits))
+                else:
+                    value, = _INT_BITS.unpack(_UINT_BITS.pack(bits))
+                instr['value'] = value
+            instrs.append(instr)
+
+        return func
+
+    def functions(self):
+        for i in range(self.n_funcs):
+            yield self.function(i)
+
+    def to_json(self):
+        """Decode the entire program as JSON-like data.
+        """
+        return {'functions': list(self.functions())}
+
+
+def is_binary(data):
+    """Check whether some bytes (at least the first four of a file) look
+    like the start of a binary Bril program.
+    """
+    return data[:len(MAGIC)] == MAGIC
+
+
+def open_binary(f):
+    """Get a `BinaryProgram` for a binary file object. Regular files are
+    memory-mapped; other streams (like pipes) are read into memory.
+    """
+    try:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, AttributeError):
+        buf = f.read()
+    return BinaryProgram(buf)
+
+
+def load(f):
+    """Load a binary Bril program from a binary file object and decode
+    it as JSON-like data.
+    """
+    return open_binary(f).to_json()
+
+
+# Command-line entry points.
+
+def bril2bin():
+    sys.stdout.buffer.write(encode(json.load(sys.stdin)))
+
+
+def bin2bril():
+    json.dump(load(sys.stdin.buffer), sys.stdout, indent=2, sort_keys=True)
+    print()
@@ -7,9 +7,11 @@ pretty-prints it in the text format, and `bril2json`, which parses the
 format and emits the ordinary JSON representation.
 """
 
-import lark
 import sys
 import json
+import functools
+import io
+import re
 
 __version__ = '0.0.1'
 
@@ -19,7 +21,7 @@ __version__ = '0.0.1'
 GRAMMAR = """
 start: func*
 
-func: FUNC ["(" arg_list? ")"] [tyann] "{" instr* "}"
+func: FUNC ["(" arg_list ")"] [tyann] "{" instr* "}"
 arg_list: | arg ("," arg)*
 arg: IDENT ":" type
 ?instr: const | vop | eop | label
@@ -56,7 +58,16 @@ COMMENT: /#.*/
 """.strip()
 
 
-class JSONTransformer(lark.Transformer):
+class JSONTransformer:
+    """Convert parse trees to the JSON representation.
+
+    The LALR parser applies these callbacks directly while parsing. To
+    use this class on a parse tree instead, mix it into a
+    `lark.Transformer` subclass. (It does not inherit from
+    `lark.Transformer` itself so that importing this module does not
+    import Lark, which only `bril2json` needs.)
+    """
+
     def start(self, items):
         return {'functions': items}
 
@@ -155,13 +166,96 @@ class JSONTransformer(lark.Transformer):
         return float(items[0])
 
 
+@functools.lru_cache(maxsize=None)
+def get_parser():
+    """Get the (shared) LALR parser for the text format.
+
+    The parser applies `JSONTransformer` while it parses, so it produces
+    JSON-ready data directly without building a parse tree. Lark's grammar
+    analysis is the expensive part of constructing a parser, so we cache
+    its tables in a file in the temporary directory (keyed on the grammar
+    and the Lark version) and build the parser at most once per process.
+    """
+    import lark
+    return lark.Lark(
+        GRAMMAR,
+        parser='lalr',
+        maybe_placeholders=True,
+        transformer=JSONTransformer(),
+        cache=True,
+    )
+
+
 def parse_bril(txt):
-    parser = lark.Lark(GRAMMAR, maybe_placeholders=True)
-    tree = parser.parse(txt)
-    data = JSONTransformer().transform(tree)
+    data = get_parser().parse(txt)
     return json.dumps(data, indent=2, sort_keys=True)
 
 
+def func_chunks(lines):
+    """Split a text-format program, given as an iterable of lines, into
+    strings that each contain (at most) one complete function.
+
+    Function bodies are the only place braces appear in the text format,
+    so we just need to find the closing brace at nesting depth zero
+    (ignoring comments). The last chunk may contain only whitespace and
+    comments.
+    """
+    buf = []
+    depth = 0
+    for line in lines:
+        code = line.split('#', 1)[0]
+        if '{' not in code and '}' not in code:
+            buf.append(line)
+            continue
+
+        start = 0
+        for i, c in enumerate(code):
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+                if depth == 0:
+                    buf.append(line[start:i + 1])
+                    yield ''.join(buf)
+                    buf = []
+                    start = i + 1
+        buf.append(line[start:])
+
+    tail = ''.join(buf)
+    if tail.strip():
+        yield tail
+
+
+def parse_funcs(lines):
+    """Parse a text-format program, given as an iterable of lines, one
+    function at a time. Generate the JSON representation of each
+    function.
+    """
+    parser = get_parser()
+    for chunk in func_chunks(lines):
+        yield from parser.parse(chunk)['functions']
+
+
+def write_json(funcs, out):
+    """Write a JSON program consisting of the functions in the iterable
+    `funcs` to the stream `out`, one function at a time.
+
+    The output is identical to dumping the whole program at once with
+    `json.dumps(..., indent=2, sort_keys=True)`.
+    """
+    out.write('{\n  "functions": [')
+    sep = '\n'
+    for func in funcs:
+        text = json.dumps(func, indent=2, sort_keys=True)
+        out.write(sep)
+        out.write(text.replace('\n', '\n    ').join(('    ', '')))
+        sep = ',\n'
+    if sep == '\n':
+        out.write(']\n}')
+    else:
+        out.write('\n  ]\n}')
+
+
 # Text format pretty-printer.
 
 def type_to_str(type):
@@ -173,45 +267,55 @@ def type_to_str(type):
         return type
 
 
-def instr_to_string(instr):
-    if instr['op'] == 'const':
-        tyann = ': {}'.format(type_to_str(instr['type'])) \
-            if 'type' in instr else ''
-        return '{}{} = const {}'.format(
-            instr['dest'],
-            tyann,
-            str(instr['value']).lower(),
-        )
+def _tyann(instr):
+    """Get the type annotation for an instruction's destination.
+    """
+    typ = instr.get('type')
+    if typ is None:
+        return ''
+    elif isinstance(typ, str):
+        return ': ' + typ
     else:
-        rhs = instr['op']
-        if instr.get('funcs'):
-            rhs += ' {}'.format(' '.join(
-                '@{}'.format(f) for f in instr['funcs']
-            ))
-        if instr.get('args'):
-            rhs += ' {}'.format(' '.join(instr['args']))
-        if instr.get('labels'):
-            rhs += ' {}'.format(' '.join(
-                '.{}'.format(f) for f in instr['labels']
-            ))
-        if 'dest' in instr:
-            tyann = ': {}'.format(type_to_str(instr['type'])) \
-                if 'type' in instr else ''
-            return '{}{} = {}'.format(
-                instr['dest'],
-                tyann,
-                rhs,
-            )
-        else:
-            return rhs
+        return ': ' + type_to_str(typ)
 
 
-def print_instr(instr):
-    print('  {};'.format(instr_to_string(instr)))
+def _const_to_string(instr):
+    return '{}{} = const {}'.format(
+        instr['dest'],
+        _tyann(instr),
+        str(instr['value']).lower(),
+    )
 
 
-def print_label(label):
-    print('.{}:'.format(label['label']))
+# Formatters for opcodes whose syntax is not the usual `dest: type = op
+# @funcs args .labels`, keyed by opcode.
+FORMATTERS = {
+    'const': _const_to_string,
+}
+
+
+def instr_to_string(instr):
+    op = instr['op']
+    formatter = FORMATTERS.get(op)
+    if formatter:
+        return formatter(instr)
+
+    parts = [op]
+    funcs = instr.get('funcs')
+    if funcs:
+        parts += ['@' + f for f in funcs]
+    args = instr.get('args')
+    if args:
+        parts += args
+    labels = instr.get('labels')
+    if labels:
+        parts += ['.' + lbl for lbl in labels]
+    rhs = ' '.join(parts)
+
+    if 'dest' in instr:
+        return instr['dest'] + _tyann(instr) + ' = ' + rhs
+    else:
+        return rhs
 
 
 def args_to_string(args):
@@ -224,31 +328,209 @@ def args_to_string(args):
         return ''
 
 
-def print_func(func):
+def func_header(func):
     typ = func.get('type', 'void')
-    print('@{}{}{} {{'.format(
+    return '@{}{}{} {{'.format(
         func['name'],
         args_to_string(func.get('args', [])),
         ': {}'.format(type_to_str(typ)) if typ != 'void' else '',
-    ))
-    for instr_or_label in func['instrs']:
-        if 'label' in instr_or_label:
-            print_label(instr_or_label)
-        else:
-            print_instr(instr_or_label)
-    print('}')
+    )
+
+
+class Printer:
+    """Render text-format code into a writable text stream.
+
+    Output is collected in a buffer and written to the stream in large
+    chunks, which is much faster than printing each line individually.
+    Call `flush` (or use the printer as a context manager) when done.
+    """
+
+    def __init__(self, out, bufsize=4096):
+        self.out = out
+        self.bufsize = bufsize
+        self.buf = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def flush(self):
+        self.out.write(''.join(self.buf))
+        self.buf = []
+
+    def line(self, text):
+        """Emit a line of text.
+        """
+        buf = self.buf
+        buf.append(text)
+        buf.append('\n')
+        if len(buf) >= self.bufsize:
+            self.flush()
+
+    def instr(self, instr):
+        self.line('  ' + instr_to_string(instr) + ';')
+
+    def label(self, label):
+        self.line('.' + label['label'] + ':')
+
+    def func(self, func):
+        self.line(func_header(func))
+        buf = self.buf
+        for instr in func['instrs']:
+            if 'label' in instr:
+                buf.append('.' + instr['label'] + ':\n')
+            else:
+                buf.append('  ' + instr_to_string(instr) + ';\n')
+            if len(buf) >= self.bufsize:
+                self.flush()
+                buf = self.buf
+        self.line('}')
+
+    def prog(self, prog):
+        for func in prog['functions']:
+            self.func(func)
+
+
+def write_prog(prog, out):
+    """Write a program in the text format to the stream `out`.
+    """
+    with Printer(out) as printer:
+        printer.prog(prog)
+
+
+def prog_to_string(prog):
+    """Render a program in the text format as a single string.
+    """
+    out = io.StringIO()
+    write_prog(prog, out)
+    return out.getvalue()
+
+
+def print_instr(instr):
+    print('  {};'.format(instr_to_string(instr)))
+
+
+def print_label(label):
+    print('.{}:'.format(label['label']))
+
+
+def print_func(func):
+    with Printer(sys.stdout) as printer:
+        printer.func(func)
 
 
 def print_prog(prog):
-    for func in prog['functions']:
-        print_func(func)
+    write_prog(prog, sys.stdout)
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class FuncReader:
+    """Incrementally read the functions from a JSON program.
+
+    Only the current function (and a chunk of the input stream) is in
+    memory at any time. Other top-level keys in the program are parsed
+    and discarded.
+    """
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        """Read more input, or raise an error if there is none.
+        """
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            raise ValueError('unexpected end of JSON input')
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def _peek(self):
+        """Skip whitespace and get the next character.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self._fill(self.chunk_size)
+
+    def _expect(self, chars):
+        c = self._peek()
+        if c not in chars:
+            raise ValueError('expected one of {!r} in JSON, found {!r}'
+                             .format(chars, c))
+        self.pos += 1
+        return c
+
+    def _value(self):
+        """Decode the next JSON value.
+        """
+        self._peek()
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # A number at the very end of the buffer may continue in
+                # the next chunk.
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return val
+
+            # The value is incomplete. Read at least as much again as we
+            # already have, so large values take linear time to decode.
+            try:
+                self._fill(max(self.chunk_size, len(self.buf) - self.pos))
+            except ValueError:
+                pass
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'functions':
+                self._expect('[')
+                if self._peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self._value()
+            if self._expect(',}') == '}':
+                return
 
 
 # Command-line entry points.
 
 def bril2json():
-    print(parse_bril(sys.stdin.read()))
+    if '--stream' in sys.argv[1:]:
+        write_json(parse_funcs(sys.stdin), sys.stdout)
+        print()
+    else:
+        print(parse_bril(sys.stdin.read()))
 
 
 def bril2txt():
-    print_prog(json.load(sys.stdin))
+    with Printer(sys.stdout) as printer:
+        if '--stream' in sys.argv[1:]:
+            for func in FuncReader(sys.stdin):
+                printer.func(func)
+        else:
+            printer.prog(json.load(sys.stdin))
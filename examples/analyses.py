@@ -0,0 +1,136 @@
+"""Cache analyses of Bril functions so a pipeline of passes only
+recomputes what it needs to.
+
+An `AnalysisManager` computes each analysis in `ANALYSES` on demand and
+remembers the result for each function. After a pass changes a function,
+invalidate its analyses, keeping only the ones that the pass preserves.
+"""
+
+from collections import Counter
+
+from cfg import CFG, FlowGraph, block_map, add_terminators, add_entry
+from defuse import DefUse
+from form_blocks import form_blocks
+import df
+import dom
+import loops
+
+
+def _cfg(func, am):
+    """The block map, with a unique entry block and a terminator in
+    every block, as a `FlowGraph`.
+    """
+    blocks = block_map(form_blocks(func.instrs))
+    add_entry(blocks)
+    add_terminators(blocks)
+    return FlowGraph(blocks)
+
+
+def _live(func, am):
+    """Live variables at the start and end of each block, as a pair of
+    dicts.
+    """
+    return df.df_sets(am.get(func, 'cfg'), df.ANALYSES['live'])
+
+
+# Each analysis takes a function and the manager (to get the analyses it
+# depends on).
+ANALYSES = {
+    'cfg': _cfg,
+    'graph': lambda func, am: CFG.from_blocks(am.get(func, 'cfg')),
+    'succ': lambda func, am: am.get(func, 'cfg').succ,
+    'pred': lambda func, am: am.get(func, 'cfg').pred_map(),
+    'dom': lambda func, am: dom.dom_map(am.get(func, 'graph')),
+    'idom': lambda func, am: dom.graph_idom(am.get(func, 'graph'),
+                                            am.idom),
+    'dom_tree': lambda func, am: dom.idom_tree(am.get(func, 'graph'),
+                                               am.get(func, 'idom')),
+    'dom_numbers': lambda func, am: dom.DomTree(am.get(func, 'graph'),
+                                                am.get(func, 'idom')),
+    'frontiers': lambda func, am: dom.fronts_map(
+        am.get(func, 'graph'),
+        dom.graph_fronts(am.get(func, 'graph'), am.get(func, 'idom')),
+    ),
+    'loops': lambda func, am: loops.find_loops(am.get(func, 'graph'),
+                                               am.get(func, 'dom_numbers')),
+    'live': _live,
+    'def_use': lambda func, am: DefUse(am.get(func, 'cfg'),
+                                       func.arg_names()),
+}
+
+# The analyses that depend only on the shape of the control flow graph
+# (its blocks and edges), not on the instructions inside the blocks. A
+# pass that changes instructions but never adds, removes, or retargets
+# a block (or a label or terminator) preserves these.
+SHAPE = frozenset(['graph', 'succ', 'pred', 'dom', 'idom', 'dom_tree',
+                   'dom_numbers', 'frontiers', 'loops'])
+
+# The analyses that look at the instructions.
+INSTRS = frozenset(['live', 'def_use'])
+
+# Everything. A pass that only edits the blocks in the cached `cfg` in
+# place, and then reassembles the function from them, preserves all of
+# the analyses except the ones in `INSTRS`.
+ALL = frozenset(ANALYSES)
+
+
+class AnalysisManager:
+    """A cache of analysis results for each function. `counts` records
+    how many times each analysis has actually been computed. `idom` is
+    the algorithm (from `dom.IDOM`) for immediate dominators.
+
+    Passes can also edit the cached `cfg` (a `FlowGraph`) through its
+    methods. The shape analyses remember the graph's `version` when they
+    were computed and are recomputed if it has changed since. (The
+    `succ` analysis is the graph's own successor map, which is always up
+    to date.) When a pass preserves the shape analyses but not the
+    `cfg`, the new graph has the same shape, so the shape analyses that
+    were up to date are stamped again with the new graph.
+    """
+    def __init__(self, idom='chk'):
+        self.idom = idom
+        self.cache = {}
+        self.stamps = {}
+        self.counts = Counter()
+
+    def get(self, func, name):
+        """Get the result of an analysis, computing it if it's not in the
+        cache or if it's stale.
+        """
+        results = self.cache.setdefault(func, {})
+        if name in results and name in SHAPE:
+            graph, version = self.stamps[func, name]
+            if graph is results.get('cfg') and graph.version != version:
+                del results[name]
+        if name not in results:
+            result = ANALYSES[name](func, self)
+            if name == 'cfg':
+                self._restamp(func, results, result)
+            results[name] = result
+            self.counts[name] += 1
+            if name in SHAPE:
+                graph = results['cfg']
+                self.stamps[func, name] = graph, graph.version
+        return results[name]
+
+    def _restamp(self, func, results, graph):
+        """Stamp the cached shape analyses of a function with a newly
+        built `cfg`, or forget them if they were already stale. (`succ`
+        belongs to the old graph, so it is always forgotten.)
+        """
+        for name in SHAPE.intersection(results):
+            old, version = self.stamps[func, name]
+            if name == 'succ' or old.version != version:
+                del results[name]
+            else:
+                self.stamps[func, name] = graph, graph.version
+
+    def invalidate(self, func, preserve=()):
+        """Forget the analyses of a function, except those in
+        `preserve`.
+        """
+        results = self.cache.get(func)
+        if results:
+            for name in list(results):
+                if name not in preserve:
+                    del results[name]
@@ -1,11 +1,13 @@
+from array import array
 from collections import OrderedDict
 from util import fresh, flatten
 from form_blocks import TERMINATORS
+from ir import Block, Instr, Label
 
 
 def block_map(blocks):
     """Given a sequence of basic blocks, which are lists of instructions,
-    produce a `OrderedDict` mapping names to blocks.
+    produce a `OrderedDict` mapping names to `Block`s.
 
     The name of the block comes from the label it starts with, if any.
     Anonymous blocks, which don't start with a label, get an
@@ -13,20 +15,21 @@ def block_map(blocks):
     labels removed.
     """
     by_name = OrderedDict()
+    counters = {}
 
     for block in blocks:
         # Generate a name for the block.
-        if 'label' in block[0]:
+        if isinstance(block[0], Label):
             # The block has a label. Remove the label but use it for the
             # block's name.
-            name = block[0]['label']
+            name = block[0].label
             block = block[1:]
         else:
             # Make up a new name for this anonymous block.
-            name = fresh('b', by_name)
+            name = fresh('b', by_name, counters)
 
         # Add the block to the mapping.
-        by_name[name] = block
+        by_name[name] = Block(name, block)
 
     return by_name
 
@@ -37,33 +40,34 @@ def successors(instr):
     Raises a ValueError if the instruction is not a terminator (jump,
     branch, or return).
     """
-    if instr['op'] in ('jmp', 'br'):
-        return instr['labels']
-    elif instr['op'] == 'ret':
+    if instr.op in ('jmp', 'br'):
+        return instr.labels
+    elif instr.op == 'ret':
         return []  # No successors to an exit block.
     else:
-        raise ValueError('{} is not a terminator'.format(instr['op']))
+        raise ValueError('{} is not a terminator'.format(instr.op))
 
 
 def add_terminators(blocks):
     """Given an ordered block map, modify the blocks to add terminators
     to all blocks (avoiding "fall-through" control flow transfers).
     """
+    names = list(blocks.keys())
     for i, block in enumerate(blocks.values()):
         if not block:
             if i == len(blocks) - 1:
                 # In the last block, return.
-                block.append({'op': 'ret', 'args': []})
+                block.append(Instr('ret', args=[]))
             else:
-                dest = list(blocks.keys())[i + 1]
-                block.append({'op': 'jmp', 'labels': [dest]})
-        elif block[-1]['op'] not in TERMINATORS:
+                dest = names[i + 1]
+                block.append(Instr('jmp', labels=[dest]))
+        elif block[-1].op not in TERMINATORS:
             if i == len(blocks) - 1:
-                block.append({'op': 'ret', 'args': []})
+                block.append(Instr('ret', args=[]))
             else:
                 # Otherwise, jump to the next block.
-                dest = list(blocks.keys())[i + 1]
-                block.append({'op': 'jmp', 'labels': [dest]})
+                dest = names[i + 1]
+                block.append(Instr('jmp', labels=[dest]))
 
 
 def add_entry(blocks):
@@ -75,31 +79,330 @@ def add_entry(blocks):
     """
     first_lbl = next(iter(blocks.keys()))
 
-    # Check for any references to the label.
+    # Check for any jumps to the label. (The labels on a phi-node name
+    # predecessors, not successors, so they don't count.)
     for instr in flatten(blocks.values()):
-        if 'labels' in instr and first_lbl in instr['labels']:
+        if instr.op in ('jmp', 'br') and first_lbl in instr.labels:
             break
     else:
         return
 
     # References exist; insert a new block.
     new_lbl = fresh('entry', blocks)
-    blocks[new_lbl] = []
+    blocks[new_lbl] = Block(new_lbl)
     blocks.move_to_end(new_lbl, last=False)
 
 
+class CFG:
+    """A control-flow graph whose blocks are numbered densely from 0.
+
+    The edges are stored in compressed sparse row form: the successors
+    of block `i` are `succ[succ_start[i]:succ_start[i + 1]]`, and the
+    predecessors are likewise in `pred` and `pred_start`. `names` maps
+    indices to block names and `index` maps them back. `entry` is the
+    entry block and `exits` lists the blocks with no successors (the
+    ones that return, or fall off the end of the function).
+    `postorder` and `rpo` (its reverse) list the blocks reachable from
+    the entry.
+    """
+    def __init__(self, succ, entry=None):
+        """Build a graph from a map from block names to lists of
+        successor names. The entry is the first block unless given.
+        """
+        self.names = list(succ)
+        self.index = index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+
+        edges = []
+        succ_start = [0]
+        for name in self.names:
+            edges += [index[s] for s in succ[name]]
+            succ_start.append(len(edges))
+        self.succ = array('i', edges)
+        self.succ_start = array('i', succ_start)
+
+        # Transpose to get the predecessors, in the same order as
+        # `edges` produces them.
+        start = [0] * (n + 1)
+        for s in edges:
+            start[s + 1] += 1
+        for i in range(n):
+            start[i + 1] += start[i]
+        self.pred_start = array('i', start)
+        pred = [0] * len(edges)
+        for p in range(n):
+            for j in range(succ_start[p], succ_start[p + 1]):
+                s = edges[j]
+                pred[start[s]] = p
+                start[s] += 1
+        self.pred = array('i', pred)
+
+        self.exits = [i for i in range(n)
+                      if succ_start[i] == succ_start[i + 1]]
+        if n:
+            self.entry = 0 if entry is None else index[entry]
+            self.postorder = self.dfs_postorder()
+        else:
+            self.entry = None
+            self.postorder = array('i')
+        self.rpo = self.postorder[::-1]
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """Build a graph from a block map containing blocks complete
+        with terminators.
+        """
+        return cls(OrderedDict((name, successors(block[-1]))
+                               for name, block in blocks.items()))
+
+    def __len__(self):
+        return len(self.names)
+
+    def successors(self, i):
+        return self.succ[self.succ_start[i]:self.succ_start[i + 1]]
+
+    def predecessors(self, i):
+        return self.pred[self.pred_start[i]:self.pred_start[i + 1]]
+
+    def dfs_postorder(self, reverse=False):
+        """Depth-first search from the entry, visiting successors in
+        order (or in reverse order, if `reverse`). Return the reachable
+        blocks in postorder.
+        """
+        succ = self.succ
+        step = -1 if reverse else 1
+        out = array('i')
+        if not self.names:
+            return out
+        explored = bytearray(len(self.names))
+        explored[self.entry] = 1
+        stack = [self._dfs_frame(self.entry, reverse)]
+        while stack:
+            node, pos, end = stack[-1]
+            if pos != end:
+                stack[-1] = node, pos + step, end
+                s = succ[pos]
+                if not explored[s]:
+                    explored[s] = 1
+                    stack.append(self._dfs_frame(s, reverse))
+            else:
+                stack.pop()
+                out.append(node)
+        return out
+
+    def _dfs_frame(self, node, reverse):
+        """The node, the position of its first successor to visit, and
+        the position to stop at.
+        """
+        start, end = self.succ_start[node], self.succ_start[node + 1]
+        if reverse:
+            return node, end - 1, start - 1
+        return node, start, end
+
+    # Adapters for code that works with names.
+
+    def succ_map(self):
+        names = self.names
+        return {name: [names[s] for s in self.successors(i)]
+                for i, name in enumerate(names)}
+
+    def pred_map(self):
+        names = self.names
+        return {name: [names[p] for p in self.predecessors(i)]
+                for i, name in enumerate(names)}
+
+
+class FlowGraph(OrderedDict):
+    """A block map (containing blocks complete with terminators) that
+    keeps its edges up to date as it is edited.
+
+    `succ` maps each block name to a list of successor names, like
+    `successors` of its terminator. `pred` maps each block name to a
+    dict from predecessor names to the number of edges from that
+    predecessor, so edges can be added and removed in constant time.
+    Every edit that changes the edges increments `version`, which
+    analyses of the graph's shape can check to see if they are stale.
+
+    Edit the graph with its methods, not by modifying terminators
+    directly.
+    """
+    def __init__(self, blocks=()):
+        super(FlowGraph, self).__init__(blocks)
+        self.succ = {name: [] for name in self}
+        self.pred = {name: {} for name in self}
+        self.version = 0
+        self.counters = {}
+        for name, block in self.items():
+            for succ in successors(block[-1]):
+                self.add_edge(name, succ)
+        self.version = 0
+
+    def add_edge(self, a, b):
+        """Record an edge from block `a` to block `b`.
+        """
+        self.succ[a].append(b)
+        preds = self.pred[b]
+        preds[a] = preds.get(a, 0) + 1
+        self.version += 1
+
+    def remove_edge(self, a, b):
+        """Forget an edge from block `a` to block `b`.
+        """
+        self.succ[a].remove(b)
+        preds = self.pred[b]
+        if preds[a] == 1:
+            del preds[a]
+        else:
+            preds[a] -= 1
+        self.version += 1
+
+    def predecessors(self, name):
+        """Get a list of a block's predecessors, with one entry per
+        edge (like `edges`).
+        """
+        return [p for p, n in self.pred[name].items() for _ in range(n)]
+
+    def succ_map(self):
+        return {name: list(succs) for name, succs in self.succ.items()}
+
+    def pred_map(self):
+        return {name: self.predecessors(name) for name in self}
+
+    def add_block(self, name, block, first=False):
+        """Add a new block, complete with a terminator, at the end (or
+        the start, if `first`).
+        """
+        self[name] = block
+        self.succ[name] = []
+        self.pred[name] = {}
+        if first:
+            self.move_to_end(name, last=False)
+        for succ in successors(block[-1]):
+            self.add_edge(name, succ)
+        self.version += 1
+
+    def remove_block(self, name):
+        """Delete a block, which must not have any predecessors.
+        """
+        if self.pred[name]:
+            raise ValueError('{} has predecessors'.format(name))
+        for succ in list(self.succ[name]):
+            self.remove_edge(name, succ)
+        del self[name]
+        del self.succ[name]
+        del self.pred[name]
+        self.version += 1
+
+    def set_terminator(self, name, instr):
+        """Replace the terminator of a block.
+        """
+        block = self[name]
+        for succ in list(self.succ[name]):
+            self.remove_edge(name, succ)
+        block[-1] = instr
+        for succ in successors(instr):
+            self.add_edge(name, succ)
+
+    def _relabel_phis(self, name, old, new):
+        """Rename a predecessor in the phi-nodes of block `name`.
+        """
+        for instr in self[name]:
+            if instr.op == 'phi' and old in instr.labels:
+                instr.labels = [new if lb == old else lb
+                                for lb in instr.labels]
+
+    def split_edge(self, a, b):
+        """Insert a new, empty block on the edge (or edges) from `a` to
+        `b` and return its name. Phi-nodes in `b` are updated to refer
+        to the new block.
+        """
+        name = fresh('split', self, self.counters)
+        self.add_block(name, Block(name, [Instr('jmp', labels=[b])]))
+        term = self[a][-1]
+        labels = [name if lb == b else lb for lb in term.labels]
+        new_term = Instr(term.op, args=term.args, labels=labels)
+        new_term.extra = term.extra
+        self.set_terminator(a, new_term)
+        self._relabel_phis(b, a, name)
+        return name
+
+    def unsplit_edge(self, name):
+        """Undo `split_edge`: delete a block that has a single
+        predecessor and does nothing but jump to its successor, and send
+        the predecessor straight to the successor.
+        """
+        block = self[name]
+        if len(self.pred[name]) != 1 or len(block) != 1 or \
+                block[-1].op != 'jmp':
+            raise ValueError('cannot remove {}'.format(name))
+        a = next(iter(self.pred[name]))
+        b = block[-1].labels[0]
+        term = self[a][-1]
+        labels = [b if lb == name else lb for lb in term.labels]
+        new_term = Instr(term.op, args=term.args, labels=labels)
+        new_term.extra = term.extra
+        self.set_terminator(a, new_term)
+        self._relabel_phis(b, name, a)
+        self.remove_block(name)
+
+    def merge_blocks(self, a, b):
+        """Merge block `b` into block `a`, which must be its only
+        predecessor and must jump unconditionally to it. Phi-nodes in
+        `b` become copies of their argument from `a` (any arguments for
+        other labels, which are not predecessors, are dropped), and
+        phi-nodes in `b`'s successors are updated to refer to `a`.
+        """
+        if self.succ[a] != [b] or self.pred[b] != {a: 1} or \
+                self[a][-1].op != 'jmp':
+            raise ValueError('cannot merge {} into {}'.format(b, a))
+        for instr in self[b]:
+            if instr.op == 'phi' and a not in instr.labels:
+                raise ValueError('{} has no argument for {}'.format(
+                    instr.dest, a))
+        self.remove_edge(a, b)
+        block_a = self[a]
+        block_a.pop()  # The jump.
+        for instr in self[b]:
+            if instr.op == 'phi':
+                instr.op = 'id'
+                instr.args = [instr.args[list(instr.labels).index(a)]]
+                instr.labels = None
+            block_a.append(instr)
+        for succ in list(self.succ[b]):
+            self.remove_edge(b, succ)
+            self.add_edge(a, succ)
+            self._relabel_phis(succ, b, a)
+        del self[b]
+        del self.succ[b]
+        del self.pred[b]
+        self.version += 1
+
+
+def merge_chains(graph):
+    """Merge every block of a `FlowGraph` (except the entry) into its
+    predecessor, where that is its only predecessor and it jumps
+    straight to the block. Return the number of blocks merged.
+    """
+    merged = 0
+    for name in list(graph)[1:]:
+        preds = graph.pred[name]
+        if len(preds) != 1:
+            continue
+        pred = next(iter(preds))
+        if pred != name and graph.succ[pred] == [name] and \
+                graph[pred][-1].op == 'jmp':
+            graph.merge_blocks(pred, name)
+            merged += 1
+    return merged
+
+
 def edges(blocks):
     """Given a block map containing blocks complete with terminators,
     generate two mappings: predecessors and successors. Both map block
     names to lists of block names.
     """
-    preds = {name: [] for name in blocks}
-    succs = {name: [] for name in blocks}
-    for name, block in blocks.items():
-        for succ in successors(block[-1]):
-            succs[name].append(succ)
-            preds[succ].append(name)
-    return preds, succs
+    graph = CFG.from_blocks(blocks)
+    return graph.pred_map(), graph.succ_map()
 
 
 def reassemble(blocks):
@@ -108,6 +411,6 @@ def reassemble(blocks):
     # `jmp .next` and `ret` terminators where it is allowed.
     instrs = []
     for name, block in blocks.items():
-        instrs.append({'label': name})
+        instrs.append(Label(name))
         instrs += block
     return instrs
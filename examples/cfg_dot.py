@@ -3,9 +3,9 @@ emit a GraphViz file.
 """
 
 from form_blocks import form_blocks
-import json
 import sys
 from cfg import block_map, successors, add_terminators
+import ir
 
 
 def cfg_dot(bril, verbose):
@@ -14,34 +14,45 @@ def cfg_dot(bril, verbose):
 
     In `verbose` mode, include the instructions in the vertices.
     """
-    for func in bril['functions']:
-        print('digraph {} {{'.format(func['name']))
+    if verbose:
+        import briltxt
+        with briltxt.Printer(sys.stdout) as out:
+            emit_dot(bril, out.line, briltxt.instr_to_string)
+    else:
+        emit_dot(bril, print)
 
-        blocks = block_map(form_blocks(func['instrs']))
+
+def emit_dot(bril, line, instr_to_string=None):
+    """Write the "dot" file for `cfg_dot` one line at a time with `line`.
+    Given `instr_to_string`, label the vertices with their instructions.
+    """
+    for func in bril.functions:
+        line('digraph {} {{'.format(func.name))
+
+        blocks = block_map(form_blocks(func.instrs))
 
         # Insert terminators into blocks that don't have them.
         add_terminators(blocks)
 
         # Add the vertices.
         for name, block in blocks.items():
-            if verbose:
-                import briltxt
-                print(r'  {} [shape=box, xlabel="{}", label="{}\l"];'.format(
+            if instr_to_string:
+                line(r'  {} [shape=box, xlabel="{}", label="{}\l"];'.format(
                     name,
                     name,
-                    r'\l'.join(briltxt.instr_to_string(i) for i in block),
+                    r'\l'.join(instr_to_string(i.to_json()) for i in block),
                 ))
             else:
-                print('  {};'.format(name))
+                line('  {};'.format(name))
 
         # Add the control-flow edges.
         for i, (name, block) in enumerate(blocks.items()):
             succ = successors(block[-1])
             for label in succ:
-                print('  {} -> {};'.format(name, label))
+                line('  {} -> {};'.format(name, label))
 
-        print('}')
+        line('}')
 
 
 if __name__ == '__main__':
-    cfg_dot(json.load(sys.stdin), '-v' in sys.argv[1:])
+    cfg_dot(ir.load(), '-v' in sys.argv[1:])
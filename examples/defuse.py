@@ -0,0 +1,132 @@
+"""Def-use chains for functions in SSA form.
+
+In SSA form, every variable has a single definition, so a `DefUse` index
+can map each name straight to the instruction that defines it and to
+the instructions that use it. Sparse passes that follow values instead
+of scanning the whole function can look things up in the index and keep
+it up to date as they replace uses and delete instructions, so their
+work is proportional to what changes. (The index does not edit the
+blocks itself. A pass deletes instructions from their blocks and tells
+the index with `remove`, so a pass that deletes many instructions can
+filter each block once.)
+
+Run this file to print the chains for each function:
+
+    $ bril2json < prog.bril | python to_ssa.py | python defuse.py
+
+With `-c`, it first propagates copies (see `propagate_copies`) and
+prints the chains from the index as it was kept up to date.
+"""
+
+import sys
+
+from form_blocks import form_blocks
+import cfg
+import ir
+
+
+class DefUse:
+    """The def-use chains of a block map in SSA form. Raise a ValueError
+    if a variable is assigned more than once.
+
+    `defs` maps each variable that an instruction defines to that
+    instruction, and `uses` maps each variable to a dict whose keys are
+    the instructions that use it (once each, even if they use it more
+    than once), so use sites can be added and removed in constant time.
+    The function's arguments (`args`) are defined on entry, with no
+    instruction. `where` maps each instruction in the index to the name
+    of its block.
+    """
+    def __init__(self, blocks, args=()):
+        self.args = set(args)
+        self.defs = {}
+        self.uses = {}
+        self.where = {}
+        for name, block in blocks.items():
+            for instr in block:
+                self.add(name, instr)
+
+    def add(self, block, instr):
+        """Record an instruction that has been put into a block.
+        """
+        dest = instr.dest
+        if dest is not None:
+            if dest in self.defs or dest in self.args:
+                raise ValueError('{} is assigned more than once'.format(
+                    dest))
+            self.defs[dest] = instr
+        for arg in instr.args or ():
+            self.uses.setdefault(arg, {})[instr] = None
+        self.where[instr] = block
+
+    def users(self, var):
+        """Get the list of instructions that use a variable.
+        """
+        return list(self.uses.get(var, ()))
+
+    def is_dead(self, var):
+        return not self.uses.get(var)
+
+    def replace_all_uses(self, old, new):
+        """Make every instruction that uses `old` use `new` instead.
+        Return the list of instructions that changed.
+        """
+        users = list(self.uses.pop(old, ()))
+        new_uses = self.uses.setdefault(new, {})
+        for instr in users:
+            instr.args = [new if a == old else a for a in instr.args]
+            new_uses[instr] = None
+        return users
+
+    def remove(self, instr):
+        """Forget an instruction that has been deleted from its block.
+        Return the list of variables it used that are now dead.
+        """
+        del self.where[instr]
+        if instr.dest is not None:
+            del self.defs[instr.dest]
+        dead = []
+        for arg in set(instr.args or ()):
+            uses = self.uses[arg]
+            del uses[instr]
+            if not uses:
+                dead.append(arg)
+        return dead
+
+
+def propagate_copies(blocks, index):
+    """Replace each variable that is a copy of another (with `id`) by the
+    original everywhere, and delete the copy. Return the number of copies
+    deleted.
+    """
+    copies = [i for i in index.defs.values() if i.op == 'id']
+    for instr in copies:
+        index.replace_all_uses(instr.dest, instr.args[0])
+        index.remove(instr)
+    deleted = set(copies)
+    for block in blocks.values():
+        block[:] = [i for i in block if i not in deleted]
+    return len(copies)
+
+
+def print_chains(bril, copies=False):
+    for func in bril.functions:
+        blocks = cfg.block_map(form_blocks(func.instrs))
+        index = DefUse(blocks, func.arg_names())
+        if copies:
+            propagate_copies(blocks, index)
+        print('{}:'.format(func.name))
+        for var in func.arg_names() + list(index.defs):
+            users = sorted({index.where[i] for i in index.users(var)})
+            where = index.where[index.defs[var]] \
+                if var in index.defs else 'args'
+            print('  {}: {} -> {}'.format(
+                var, where, ', '.join(users) if users else '∅',
+            ))
+
+
+if __name__ == '__main__':
+    try:
+        print_chains(ir.load(), '-c' in sys.argv[1:])
+    except ValueError as e:
+        sys.exit('error: {}'.format(e))
@@ -1,9 +1,11 @@
+import heapq
 import sys
-import json
 from collections import namedtuple
 
 from form_blocks import form_blocks
 import cfg
+import ir
+import util
 
 # A single dataflow analysis consists of these part:
 # - forward: True for forward, False for backward.
@@ -12,54 +14,176 @@ import cfg
 # - transfer: The transfer function.
 Analysis = namedtuple('Analysis', ['forward', 'init', 'merge', 'transfer'])
 
+# A bit-vector analysis is a faster kind of analysis whose values are
+# sets of things (like variables), represented as ints where bit i means
+# that the set contains `universe[i]`. The merge is union and the
+# transfer function is `gen | (in & ~kill)`, with gen and kill bits that
+# are computed once for each block. It consists of:
+# - forward: True for forward, False for backward.
+# - gen_kill: Take a list of blocks and produce the universe (a list of
+#   names) and lists of the gen bits and kill bits for each block.
+BitAnalysis = namedtuple('BitAnalysis', ['forward', 'gen_kill'])
+
+
+class Worklist:
+    """A queue of blocks (by index) that holds each block at most once
+    and pops them in a fixed priority order: reverse postorder for
+    forward problems and postorder for backward ones, so a block is
+    usually visited after the blocks that flow into it. Unreachable
+    blocks come last. It starts out holding every block.
+
+    The reverse postorder comes from a search that visits successors
+    last to first. For a loop like `br cond .body .done`, that puts the
+    body before everything after the loop, so the loop settles before
+    its results flow onward. (Visiting `.done` first puts the body
+    after the rest of the function, and every trip around the loop
+    pushes changes through all of it again.)
+    """
+    def __init__(self, graph, forward):
+        n = len(graph)
+        if forward:
+            order = list(graph.dfs_postorder(reverse=True))[::-1]
+        else:
+            order = list(graph.postorder)
+        reached = bytearray(n)
+        for i in order:
+            reached[i] = 1
+        order += [i for i in range(n) if not reached[i]]
+        self.order = order
+        self.rank = [0] * n
+        for r, i in enumerate(order):
+            self.rank[i] = r
+        self.heap = list(range(n))  # Ranks, which are already a heap.
+        self.queued = bytearray(b'\x01') * n
 
-def union(sets):
-    out = set()
-    for s in sets:
-        out.update(s)
-    return out
+    def __bool__(self):
+        return bool(self.heap)
 
+    def pop(self):
+        node = self.order[heapq.heappop(self.heap)]
+        self.queued[node] = 0
+        return node
 
-def df_worklist(blocks, analysis):
+    def extend(self, nodes):
+        for node in nodes:
+            if not self.queued[node]:
+                self.queued[node] = 1
+                heapq.heappush(self.heap, self.rank[node])
+
+
+def df_worklist(blocks, analysis, stats=None):
     """The worklist algorithm for iterating a data flow analysis to a
     fixed point.
+
+    If `stats` is a dict (like a `Counter`), add the number of times the
+    transfer function was evaluated to its `visits` entry.
     """
-    preds, succs = cfg.edges(blocks)
+    graph = cfg.CFG.from_blocks(blocks)
+    block_list = list(blocks.values())
 
     # Switch between directions.
     if analysis.forward:
-        first_block = list(blocks.keys())[0]  # Entry.
-        in_edges = preds
-        out_edges = succs
+        first_blocks = [] if graph.entry is None else [graph.entry]
+        in_edges = graph.predecessors
+        out_edges = graph.successors
     else:
-        first_block = list(blocks.keys())[-1]  # Exit.
-        in_edges = succs
-        out_edges = preds
+        first_blocks = graph.exits
+        in_edges = graph.successors
+        out_edges = graph.predecessors
 
-    # Initialize.
-    in_ = {first_block: analysis.init}
-    out = {node: analysis.init for node in blocks}
+    # Initialize. The values are lists indexed by block.
+    in_ = [None] * len(graph)
+    for b in first_blocks:
+        in_[b] = analysis.init
+    out = [analysis.init] * len(graph)
 
     # Iterate.
-    worklist = list(blocks.keys())
+    worklist = Worklist(graph, analysis.forward)
+    visits = 0
     while worklist:
-        node = worklist.pop(0)
+        node = worklist.pop()
+        visits += 1
 
-        inval = analysis.merge(out[n] for n in in_edges[node])
+        inval = analysis.merge(out[n] for n in in_edges(node))
         in_[node] = inval
 
-        outval = analysis.transfer(blocks[node], inval)
+        outval = analysis.transfer(block_list[node], inval)
 
         if outval != out[node]:
             out[node] = outval
-            worklist += out_edges[node]
+            worklist.extend(out_edges(node))
+    if stats is not None:
+        stats['visits'] = stats.get('visits', 0) + visits
 
+    # Map the results back to block names.
+    in_ = dict(zip(graph.names, in_))
+    out = dict(zip(graph.names, out))
     if analysis.forward:
         return in_, out
     else:
         return out, in_
 
 
+def df_bits(blocks, analysis, stats=None):
+    """The worklist algorithm for a `BitAnalysis`. Return the universe
+    and the in and out bits for every block, as dicts. `stats` is as for
+    `df_worklist`.
+    """
+    graph = cfg.CFG.from_blocks(blocks)
+    universe, gen, kill = analysis.gen_kill(list(blocks.values()))
+
+    if analysis.forward:
+        in_edges = graph.predecessors
+        out_edges = graph.successors
+    else:
+        in_edges = graph.successors
+        out_edges = graph.predecessors
+
+    in_ = [0] * len(graph)
+    out = [0] * len(graph)
+    worklist = Worklist(graph, analysis.forward)
+    visits = 0
+    while worklist:
+        node = worklist.pop()
+        visits += 1
+
+        inval = 0
+        for n in in_edges(node):
+            inval |= out[n]
+        in_[node] = inval
+
+        outval = gen[node] | (inval & ~kill[node])
+        if outval != out[node]:
+            out[node] = outval
+            worklist.extend(out_edges(node))
+    if stats is not None:
+        stats['visits'] = stats.get('visits', 0) + visits
+
+    in_ = dict(zip(graph.names, in_))
+    out = dict(zip(graph.names, out))
+    if analysis.forward:
+        return universe, in_, out
+    else:
+        return universe, out, in_
+
+
+def bits_to_set(bits, universe):
+    """Convert the bits of a `BitAnalysis` value to a set of names.
+    """
+    return {universe[i] for i in util.iter_bits(bits)}
+
+
+def df_sets(blocks, analysis, stats=None):
+    """Run any analysis, converting the results of a `BitAnalysis` to
+    sets of names.
+    """
+    if isinstance(analysis, BitAnalysis):
+        universe, in_, out = df_bits(blocks, analysis, stats)
+        return ({b: bits_to_set(v, universe) for b, v in in_.items()},
+                {b: bits_to_set(v, universe) for b, v in out.items()})
+    return df_worklist(blocks, analysis, stats)
+
+
 def fmt(val):
     """Guess a good way to format a data flow value. (Works for sets and
     dicts, at least.)
@@ -80,44 +204,99 @@ def fmt(val):
 
 
 def run_df(bril, analysis):
-    for func in bril['functions']:
+    for func in bril.functions:
         # Form the CFG.
-        blocks = cfg.block_map(form_blocks(func['instrs']))
+        blocks = cfg.block_map(form_blocks(func.instrs))
         cfg.add_terminators(blocks)
 
-        in_, out = df_worklist(blocks, analysis)
+        in_, out = df_sets(blocks, analysis)
         for block in blocks:
             print('{}:'.format(block))
             print('  in: ', fmt(in_[block]))
             print('  out:', fmt(out[block]))
 
 
-def gen(block):
-    """Variables that are written in the block.
+def to_bits(ids):
+    """Make an int with the given bits set.
     """
-    return {i['dest'] for i in block if 'dest' in i}
+    bits = 0
+    for i in ids:
+        bits |= 1 << i
+    return bits
 
 
-def use(block):
-    """Variables that are read before they are written in the block.
+def var_bits(blocks, names=None):
+    """Number the variables in a list of blocks. Return the variable
+    names in order, along with the variables that each block reads
+    before it writes them (its uses) and the variables that it writes
+    (its definitions), as lists of bits. If `names` is given, only the
+    variables in it are numbered, and the rest are left out.
     """
-    defined = set()  # Locally defined.
-    used = set()
-    for i in block:
-        used.update(v for v in i.get('args', []) if v not in defined)
-        if 'dest' in i:
-            defined.add(i['dest'])
-    return used
+    ids = ir.Symbols()
+    uses = []
+    defs = []
+    for block in blocks:
+        used = set()
+        defined = set()
+        for i in block:
+            if i.args:
+                for v in i.args:
+                    if names is not None and v not in names:
+                        continue
+                    v = ids.id(v)
+                    if v not in defined:
+                        used.add(v)
+            if i.dest is not None and (names is None or i.dest in names):
+                defined.add(ids.id(i.dest))
+        uses.append(to_bits(used))
+        defs.append(to_bits(defined))
+    return ids.names, uses, defs
+
+
+def defined_gen_kill(blocks):
+    universe, _, defs = var_bits(blocks)
+    return universe, defs, [0] * len(blocks)
+
+
+def live_gen_kill(blocks):
+    return var_bits(blocks)
+
+
+def reaching_gen_kill(blocks):
+    """The definitions are named `var@block`: for each variable, only the
+    last assignment in a block can reach past the end of the block.
+    """
+    universe = []
+    gen = []
+    sites = {}  # The bit indices of every definition of each variable.
+    block_dests = []
+    for block in blocks:
+        dests = {i.dest for i in block if i.dest is not None}
+        ids = set()
+        for dest in sorted(dests):
+            ids.add(len(universe))
+            sites.setdefault(dest, []).append(len(universe))
+            universe.append('{}@{}'.format(dest, block.name))
+        gen.append(to_bits(ids))
+        block_dests.append(dests)
+    masks = {dest: to_bits(ids) for dest, ids in sites.items()}
+    kill = []
+    for dests in block_dests:
+        bits = 0
+        for dest in dests:
+            bits |= masks[dest]
+        kill.append(bits)
+    return universe, gen, kill
 
 
 def cprop_transfer(block, in_vals):
     out_vals = dict(in_vals)
     for instr in block:
-        if 'dest' in instr:
-            if instr['op'] == 'const':
-                out_vals[instr['dest']] = instr['value']
+        if instr.dest is not None:
+            if instr.op == 'const':
+                out_vals[instr.dest] = instr.value
             else:
-                out_vals[instr['dest']] = '?'
+                out_vals[instr.dest] = '?'
     return out_vals
 
 
@@ -139,21 +318,15 @@ def cprop_merge(vals_list):
 ANALYSES = {
     # A really really basic analysis that just accumulates all the
     # currently-defined variables.
-    'defined': Analysis(
-        True,
-        init=set(),
-        merge=union,
-        transfer=lambda block, in_: in_.union(gen(block)),
-    ),
+    'defined': BitAnalysis(True, defined_gen_kill),
 
     # Live variable analysis: the variables that are both defined at a
     # given point and might be read along some path in the future.
-    'live': Analysis(
-        False,
-        init=set(),
-        merge=union,
-        transfer=lambda block, out: use(block).union(out - gen(block)),
-    ),
+    'live': BitAnalysis(False, live_gen_kill),
+
+    # Reaching definitions: the assignments whose values might still be
+    # in their variables at a given point.
+    'reaching': BitAnalysis(True, reaching_gen_kill),
 
     # A simple constant propagation pass.
     'cprop': Analysis(
@@ -165,5 +338,5 @@ ANALYSES = {
 }
 
 if __name__ == '__main__':
-    bril = json.load(sys.stdin)
+    bril = ir.load()
     run_df(bril, ANALYSES[sys.argv[1]])
@@ -1,8 +1,10 @@
 import json
 import sys
 
-from cfg import block_map, successors, add_terminators, add_entry
+from cfg import CFG, block_map, successors, add_terminators, add_entry
 from form_blocks import form_blocks
+from util import iter_bits
+import ir
 
 
 def map_inv(succ):
@@ -18,47 +20,32 @@ def map_inv(succ):
     return out
 
 
-def postorder_helper(succ, root, explored, out):
-    """Given a successor edge map, produce a list of all the nodes in
-    the graph in postorder by appending to the `out` list.
-    """
-    if root in explored:
-        return
-    explored.add(root)
-
-    for s in succ[root]:
-        postorder_helper(succ, s, explored, out)
-    out.append(root)
-
-
 def postorder(succ, root):
-    out = []
-    postorder_helper(succ, root, set(), out)
-    return out
-
-
-def intersect(sets):
-    sets = list(sets)
-    if not sets:
-        return set()
-    out = set(sets[0])
-    for s in sets[1:]:
-        out &= s
-    return out
-
+    """Given a successor edge map, produce a list of all the nodes
+    reachable from `root` in postorder.
+    """
+    graph = CFG(succ, root)
+    return [graph.names[i] for i in graph.postorder]
 
-def get_dom(succ, entry):
-    pred = map_inv(succ)
-    nodes = list(reversed(postorder(succ, entry)))  # Reverse postorder.
 
-    dom = {v: set(nodes) for v in succ}
+def graph_dom(graph):
+    """Compute the dominators of every block in a `CFG`, as a list of
+    bit sets (ints) indexed by block.
+    """
+    everything = 0
+    for node in graph.rpo:
+        everything |= 1 << node
+    dom = [everything] * len(graph)
 
     while True:
         changed = False
 
-        for node in nodes:
-            new_dom = intersect(dom[p] for p in pred[node])
-            new_dom.add(node)
+        for node in graph.rpo:  # Reverse postorder.
+            preds = graph.predecessors(node)
+            new_dom = dom[preds[0]] if preds else 0
+            for p in preds[1:]:
+                new_dom &= dom[p]
+            new_dom |= 1 << node
 
             if dom[node] != new_dom:
                 dom[node] = new_dom
@@ -70,6 +57,308 @@ def get_dom(succ, entry):
     return dom
 
 
+def idom_chk(graph):
+    """Compute the immediate dominators with the "engineered" iterative
+    algorithm from Cooper, Harvey, and Kennedy's "A Simple, Fast
+    Dominance Algorithm." It is simple and fast on the graphs that
+    structured code produces, but it may need many passes over
+    irreducible graphs.
+    """
+    n = len(graph)
+    idom = [-1] * n
+    if not n:
+        return idom
+    rpo = graph.rpo
+    number = [0] * n  # Position in reverse postorder.
+    for i, node in enumerate(rpo):
+        number[node] = i
+    pred, pred_start = graph.pred, graph.pred_start
+    idom[graph.entry] = graph.entry
+
+    changed = True
+    while changed:
+        changed = False
+        for node in rpo[1:]:
+            new_idom = -1
+            for j in range(pred_start[node], pred_start[node + 1]):
+                p = pred[j]
+                if idom[p] == -1:
+                    continue  # Not processed yet (or unreachable).
+                if new_idom == -1:
+                    new_idom = p
+                    continue
+                # Walk up from both to their nearest common dominator.
+                a = p
+                while a != new_idom:
+                    while number[a] > number[new_idom]:
+                        a = idom[a]
+                    while number[new_idom] > number[a]:
+                        new_idom = idom[new_idom]
+            if idom[node] != new_idom:
+                idom[node] = new_idom
+                changed = True
+
+    return idom
+
+
+def idom_lt(graph):
+    """Compute the immediate dominators with Lengauer and Tarjan's
+    algorithm, using semi-dominators and simple path compression. It
+    takes O(m log n) time on any graph.
+    """
+    n = len(graph)
+    idom = [-1] * n
+    if not n:
+        return idom
+    succ, succ_start = graph.succ, graph.succ_start
+    pred, pred_start = graph.pred, graph.pred_start
+
+    # Number the reachable blocks in depth-first preorder. Below, blocks
+    # are referred to by these numbers.
+    number = [-1] * n
+    vertex = []
+    parent = []
+    stack = [(graph.entry, -1)]
+    while stack:
+        node, p = stack.pop()
+        if number[node] != -1:
+            continue
+        number[node] = len(vertex)
+        vertex.append(node)
+        parent.append(p)
+        for j in range(succ_start[node + 1] - 1, succ_start[node] - 1, -1):
+            if number[succ[j]] == -1:
+                stack.append((succ[j], number[node]))
+
+    count = len(vertex)
+    semi = list(range(count))
+    label = list(range(count))
+    ancestor = [-1] * count  # The forest built by linking.
+    bucket = [[] for _ in range(count)]
+    dom = [0] * count
+
+    def evaluate(v):
+        """Find the vertex with the smallest semi-dominator on the path
+        from `v` up to the root of its tree in the forest, compressing
+        the path on the way.
+        """
+        if ancestor[v] == -1:
+            return v
+        path = []
+        u = v
+        while ancestor[ancestor[u]] != -1:
+            path.append(u)
+            u = ancestor[u]
+        for u in reversed(path):
+            a = ancestor[u]
+            if semi[label[a]] < semi[label[u]]:
+                label[u] = label[a]
+            ancestor[u] = ancestor[a]
+        return label[v]
+
+    for w in range(count - 1, 0, -1):
+        node = vertex[w]
+        for j in range(pred_start[node], pred_start[node + 1]):
+            v = number[pred[j]]
+            if v == -1:
+                continue  # Unreachable.
+            u = evaluate(v)
+            if semi[u] < semi[w]:
+                semi[w] = semi[u]
+        bucket[semi[w]].append(w)
+        p = parent[w]
+        ancestor[w] = p
+        for v in bucket[p]:
+            u = evaluate(v)
+            dom[v] = u if semi[u] < semi[v] else p
+        bucket[p] = []
+
+    for w in range(1, count):
+        if dom[w] != semi[w]:
+            dom[w] = dom[dom[w]]
+        idom[vertex[w]] = vertex[dom[w]]
+    idom[graph.entry] = graph.entry
+    return idom
+
+
+# The algorithms for immediate dominators.
+IDOM = {
+    'chk': idom_chk,
+    'lt': idom_lt,
+}
+
+
+def graph_idom(graph, algorithm='chk'):
+    """Compute the immediate dominator of every block in a `CFG`, as a
+    list indexed by block, with one of the algorithms in `IDOM`. The
+    entry is its own immediate dominator, and blocks that are
+    unreachable from the entry have none (-1).
+    """
+    return IDOM[algorithm](graph)
+
+
+def idom_arg(args):
+    """Remove `--idom NAME` from a list of command-line arguments and
+    return the algorithm's name (or the default). Raise a ValueError if
+    it is unknown.
+    """
+    if '--idom' not in args:
+        return 'chk'
+    i = args.index('--idom')
+    if i + 1 == len(args) or args[i + 1] not in IDOM:
+        raise ValueError('--idom needs one of: {}'.format(
+            ', '.join(sorted(IDOM))))
+    algorithm = args[i + 1]
+    del args[i:i + 2]
+    return algorithm
+
+
+def idom_tree(graph, idom):
+    """Get the dominator tree from the immediate dominators of a `CFG`:
+    a map from the name of each block to the set of the names of the
+    blocks it immediately dominates.
+    """
+    names = graph.names
+    tree = {name: set() for name in names}
+    for node, parent in enumerate(idom):
+        if parent != -1 and parent != node:
+            tree[names[parent]].add(names[node])
+    return tree
+
+
+def walk_tree(tree, root):
+    """Walk a tree (a map from each node to a collection of its
+    children) depth-first from `root`, visiting children in sorted
+    order, without recursion. Generate `(node, True)` on the way into
+    each node and `(node, False)` on the way out.
+    """
+    yield root, True
+    stack = [(root, iter(sorted(tree[root])))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            yield child, True
+            stack.append((child, iter(sorted(tree[child]))))
+            break
+        else:
+            stack.pop()
+            yield node, False
+
+
+class DomTree:
+    """The dominator tree of a `CFG`, built from its immediate
+    dominators. `children` lists the blocks each block immediately
+    dominates. `pre` and `post` number the blocks in preorder and
+    postorder on the tree (-1 for unreachable blocks), so a block
+    dominates another exactly when its interval contains the other's.
+    """
+    def __init__(self, graph, idom):
+        n = len(graph)
+        self.idom = idom
+        self.children = [[] for _ in range(n)]
+        for node, parent in enumerate(idom):
+            if parent != -1 and parent != node:
+                self.children[parent].append(node)
+
+        self.pre = [-1] * n
+        self.post = [-1] * n
+        if not n:
+            return
+        pre = post = 0
+        self.pre[graph.entry] = pre
+        stack = [(graph.entry, iter(self.children[graph.entry]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                pre += 1
+                self.pre[child] = pre
+                stack.append((child, iter(self.children[child])))
+                break
+            else:
+                stack.pop()
+                self.post[node] = post
+                post += 1
+
+    def dominates(self, a, b):
+        """Check whether block `a` dominates block `b`, in constant
+        time.
+        """
+        return self.pre[b] != -1 and self.pre[a] <= self.pre[b] and \
+            self.post[b] <= self.post[a]
+
+    def strictly_dominates(self, a, b):
+        return a != b and self.dominates(a, b)
+
+
+def graph_fronts(graph, idom):
+    """Compute the dominance frontier of every block in a `CFG` from its
+    immediate dominators, as a list (indexed by block) of lists of
+    blocks.
+
+    This is the "runner" algorithm from Cooper, Harvey, and Kennedy:
+    for each predecessor of a block, walk up the dominator tree until
+    reaching the block's immediate dominator. The block is in the
+    frontier of every block on the way. Unreachable blocks have empty
+    frontiers, and edges from them are ignored.
+    """
+    entry = graph.entry
+    front = [[] for _ in range(len(graph))]
+    for node in range(len(graph)):
+        if idom[node] == -1:
+            continue
+        # Nothing dominates the entry, so a path to it goes all the
+        # way up the tree.
+        stop = -1 if node == entry else idom[node]
+        for p in graph.predecessors(node):
+            if idom[p] == -1:
+                continue
+            runner = p
+            while runner != stop:
+                if not front[runner] or front[runner][-1] != node:
+                    front[runner].append(node)
+                if runner == entry:
+                    break
+                runner = idom[runner]
+    return front
+
+
+def fronts_map(graph, front):
+    """Convert the dominance frontiers of a `CFG` to a map from block
+    names to lists of block names.
+    """
+    names = graph.names
+    return {names[node]: [names[f] for f in fs]
+            for node, fs in enumerate(front)}
+
+
+def iterated_frontier(frontiers, blocks):
+    """Get the iterated dominance frontier of a set of blocks (given a
+    map from block names to their frontiers): the set of blocks where a
+    variable that is assigned in `blocks` needs a phi-node.
+    """
+    out = set()
+    worklist = list(blocks)
+    while worklist:
+        for block in frontiers[worklist.pop()]:
+            if block not in out:
+                out.add(block)
+                worklist.append(block)
+    return out
+
+
+def dom_map(graph):
+    """Get a map from the name of each block in a `CFG` to the set of
+    the names of the blocks that dominate it.
+    """
+    names = graph.names
+    return {names[node]: {names[i] for i in iter_bits(bits)}
+            for node, bits in enumerate(graph_dom(graph))}
+
+
+def get_dom(succ, entry):
+    return dom_map(CFG(succ, entry))
+
+
 def dom_fronts(dom, succ):
     """Compute the dominance frontier, given the dominance relation.
     """
@@ -104,20 +393,21 @@ def dom_tree(dom):
     }
 
 
-def print_dom(bril, mode):
-    for func in bril['functions']:
-        blocks = block_map(form_blocks(func['instrs']))
+def print_dom(bril, mode, algorithm='chk'):
+    for func in bril.functions:
+        blocks = block_map(form_blocks(func.instrs))
         add_entry(blocks)
         add_terminators(blocks)
         succ = {name: successors(block[-1]) for name, block in blocks.items()}
-        dom = get_dom(succ, list(blocks.keys())[0])
+        graph = CFG(succ)
 
         if mode == 'front':
-            res = dom_fronts(dom, succ)
+            res = fronts_map(graph, graph_fronts(
+                graph, graph_idom(graph, algorithm)))
         elif mode == 'tree':
-            res = dom_tree(dom)
+            res = idom_tree(graph, graph_idom(graph, algorithm))
         else:
-            res = dom
+            res = dom_map(graph)
 
         # Format as JSON for stable output.
         print(json.dumps(
@@ -127,7 +417,13 @@ def print_dom(bril, mode):
 
 
 if __name__ == '__main__':
+    args = sys.argv[1:]
+    try:
+        algorithm = idom_arg(args)
+    except ValueError as e:
+        sys.exit('error: {}'.format(e))
     print_dom(
-        json.load(sys.stdin),
-        'dom' if len(sys.argv) < 2 else sys.argv[1]
+        ir.load(),
+        'dom' if not args else args[0],
+        algorithm,
     )
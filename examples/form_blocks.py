@@ -1,9 +1,10 @@
 """Create and print out the basic blocks in a Bril function.
 """
 
-import json
 import sys
 
+import ir
+
 # Instructions that terminate a basic block.
 TERMINATORS = 'br', 'jmp', 'ret'
 
@@ -23,14 +24,14 @@ def form_blocks(instrs):
     cur_block = []
 
     for instr in instrs:
-        if 'op' in instr:  # It's an instruction.
+        if isinstance(instr, ir.Instr):  # It's an instruction.
             # Add the instruction to the currently-being-formed block.
             cur_block.append(instr)
 
             # If this is a terminator (branching instruction), it's the
             # last instruction in the block. Finish this block and
             # start a new one.
-            if instr['op'] in TERMINATORS:
+            if instr.op in TERMINATORS:
                 yield cur_block
                 cur_block = []
 
@@ -52,20 +53,21 @@ def print_blocks(bril):
     """
     import briltxt
 
-    func = bril['functions'][0]  # We only process one function.
-    for block in form_blocks(func['instrs']):
-        # Mark the block.
-        leader = block[0]
-        if 'label' in leader:
-            print('block "{}":'.format(leader['label']))
-            block = block[1:]  # Hide the label, for concision.
-        else:
-            print('anonymous block:')
+    func = bril.functions[0]  # We only process one function.
+    with briltxt.Printer(sys.stdout) as out:
+        for block in form_blocks(func.instrs):
+            # Mark the block.
+            leader = block[0]
+            if isinstance(leader, ir.Label):
+                out.line('block "{}":'.format(leader.label))
+                block = block[1:]  # Hide the label, for concision.
+            else:
+                out.line('anonymous block:')
 
-        # Print the instructions.
-        for instr in block:
-            print('  {}'.format(briltxt.instr_to_string(instr)))
+            # Print the instructions.
+            for instr in block:
+                out.line('  ' + briltxt.instr_to_string(instr.to_json()))
 
 
 if __name__ == '__main__':
-    print_blocks(json.load(sys.stdin))
+    print_blocks(ir.load())
@@ -1,47 +1,230 @@
-import json
+"""Convert programs out of SSA form, like the output of `to_ssa.py`.
+
+Each phi-node becomes a copy on every edge into its block. The copies
+on one edge happen all at once (a *parallel copy*): every phi-node reads
+its argument before any of them writes its destination. To put them on
+the edge, the copies go at the end of the predecessor if it has no
+other successors, at the start of the block if it has no other
+predecessors, and otherwise in a new block that splits the (critical)
+edge. Then they are put in an order that reads each variable before it
+is overwritten, with a temporary to break each cycle (like a swap).
+
+Putting all the copies in the predecessor, even when it branches
+somewhere else too, goes wrong when a phi-node's destination is still
+live along the other branch (the "lost copy" problem), and copying one
+phi-node at a time goes wrong when phi-nodes read each other (the
+"swap" problem).
+
+Last, names that are related by the copies and are never live at the
+same time are coalesced into one, which deletes the copies between
+them. Copies in deeper loops get coalesced first, and split blocks that
+end up empty are removed again.
+"""
+
 import sys
+from collections import defaultdict
+
+from analyses import AnalysisManager
+from cfg import reassemble
+from ir import Instr
+import df
+import ir
+
+
+def sequentialize(copies, fresh):
+    """Order a parallel copy, given as a dict from destinations to
+    sources, as a list of (dest, src) pairs for ordinary copies that
+    have the same effect. `fresh` makes a temporary for a destination
+    whose old value has to be saved to break a cycle.
+    """
+    pending = {d: s for d, s in copies.items() if d != s}
+
+    # The number of pending copies that read each variable. A
+    # destination is ready to overwrite once nothing pending reads it.
+    waiting = defaultdict(int)
+    for s in pending.values():
+        waiting[s] += 1
+    ready = [d for d in pending if not waiting[d]]
+
+    out = []
+    while pending:
+        while ready:
+            d = ready.pop()
+            s = pending.pop(d)
+            out.append((d, s))
+            waiting[s] -= 1
+            if not waiting[s] and s in pending:
+                ready.append(s)
+        if pending:
+            # Everything left is on a cycle, where each variable is read
+            # by exactly one copy. Save one variable in a temporary and
+            # have its reader read that instead.
+            d = next(iter(pending))
+            tmp = fresh(d)
+            out.append((tmp, d))
+            for r, s in pending.items():
+                if s == d:
+                    pending[r] = tmp
+                    break
+            waiting[d] = 0
+            ready.append(d)
+    return out
+
+
+def interference(func, blocks, names):
+    """Find which of the variables in `names` interfere: one is written
+    while the other is live (except when it is the source of the copy
+    that writes it). Produce a map from each name to its bit and a map
+    from each name to the bits of the names that are live when it is
+    written. Two names interfere if either one's bits include the other,
+    so each interference only has to be recorded once, on the name that
+    is written.
+    """
+    # Liveness of just these names is much cheaper than of every variable.
+    analysis = df.BitAnalysis(False,
+                              lambda blocks: df.var_bits(blocks, names))
+    universe, live_in, live_out = df.df_bits(blocks, analysis)
+    bit = {v: 1 << i for i, v in enumerate(universe)}
+    interfere = dict.fromkeys(bit, 0)
+
+    for name, block in blocks.items():
+        live = live_out[name]
+        for instr in reversed(block):
+            if instr.dest in bit:
+                live &= ~bit[instr.dest]
+                src = instr.args[0] if instr.op == 'id' else None
+                interfere[instr.dest] |= live & ~bit.get(src, 0)
+            if instr.args:
+                for a in instr.args:
+                    live |= bit.get(a, 0)
+
+    # The function's arguments are all written on entry.
+    args = [a for a in func.arg_names() if a in bit]
+    if blocks:
+        entry = live_in[next(iter(blocks))]
+        for a in args:
+            entry |= bit[a]
+        for a in args:
+            interfere[a] |= entry & ~bit[a]
+    return bit, interfere
 
-from cfg import block_map, add_terminators, add_entry, reassemble
-from form_blocks import form_blocks
 
+def coalesce(func, blocks, copies, depth):
+    """Merge the names related by `copies` (a list of (block, dest, src)
+    triples) that do not interfere, and rename the variables in `blocks`
+    to match. Copies in blocks that are deeper in loops (by `depth`) are
+    tried first. Return the set of renamed variables.
+    """
+    names = set()
+    for _, d, s in copies:
+        names.add(d)
+        names.add(s)
+    members, interfere = interference(func, blocks, names)
 
-def func_from_ssa(func):
-    blocks = block_map(form_blocks(func['instrs']))
-    add_entry(blocks)
-    add_terminators(blocks)
+    # A union-find forest, where each root keeps the bits of the names in
+    # its set (`members`) and of the names they interfere with. The root
+    # with fewer interferences joins the other one, except that function
+    # arguments always stay roots, because they cannot be renamed.
+    parent = {v: v for v in names}
+    args = set(func.arg_names())
 
-    # Replace each phi-node.
-    for block in blocks.values():
-        # Insert copies for each phi.
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    def degree(v):
+        return bin(interfere[v]).count('1')
+
+    for _, d, s in sorted(copies, key=lambda c: -depth(c[0])):
+        root, other = find(d), find(s)
+        if root == other or interfere[root] & members[other] or \
+                interfere[other] & members[root]:
+            continue
+        if other in args or (root not in args and
+                             degree(other) > degree(root)):
+            root, other = other, root
+        parent[other] = root
+        members[root] |= members.pop(other)
+        interfere[root] |= interfere.pop(other)
+
+    rename = {v: find(v) for v in names if find(v) != v}
+    if rename:
+        for block in blocks.values():
+            for instr in block:
+                if instr.dest in rename:
+                    instr.dest = rename[instr.dest]
+                if instr.args:
+                    instr.args = [rename.get(a, a) for a in instr.args]
+    return set(rename)
+
+
+def func_from_ssa(func, am=None, coalesce_copies=True):
+    """Convert a function out of SSA form. Like `to_ssa.func_to_ssa`,
+    this edits the blocks of the `cfg` analysis from `am` in place,
+    through its methods when it splits edges.
+    """
+    if am is None:
+        am = AnalysisManager()
+    blocks = am.get(func, 'cfg')
+
+    # Collect the parallel copy for each edge into a block with
+    # phi-nodes, and remove the phi-nodes.
+    types = {}
+    edges = []
+    for name, block in blocks.items():
+        parallel = {}
         for instr in block:
-            if instr.get('op') == 'phi':
-                dest = instr['dest']
-                type = instr['type']
-                for i, label in enumerate(instr['labels']):
-                    var = instr['args'][i]
-
-                    # Insert a copy in the predecessor block, before the
-                    # terminator.
-                    pred = blocks[label]
-                    pred.insert(-1, {
-                        'op': 'id',
-                        'type': type,
-                        'args': [var],
-                        'dest': dest,
-                    })
-
-        # Remove all phis.
-        new_block = [i for i in block if i.get('op') != 'phi']
-        block[:] = new_block
-
-    func['instrs'] = reassemble(blocks)
-
-
-def from_ssa(bril):
-    for func in bril['functions']:
-        func_from_ssa(func)
+            if instr.op == 'phi':
+                types[instr.dest] = instr.type
+                for label, arg in zip(instr.labels, instr.args):
+                    parallel.setdefault(label, {})[instr.dest] = arg
+        if parallel:
+            block[:] = [i for i in block if i.op != 'phi']
+            edges += [(pred, name, p) for pred, p in parallel.items()]
+
+    def _fresh(dest):
+        tmp = func.symbols.fresh('swap')
+        types[tmp] = types[dest]
+        return tmp
+
+    # Put the copies on each edge, splitting it if it's critical.
+    copies = []
+    splits = []
+    for pred, name, parallel in edges:
+        if len(blocks.succ[pred]) == 1:
+            where, at = pred, len(blocks[pred]) - 1
+        elif len(blocks.pred[name]) == 1:
+            where, at = name, 0
+        else:
+            where, at = blocks.split_edge(pred, name), 0
+            splits.append(where)
+        seq = sequentialize(parallel, _fresh)
+        blocks[where][at:at] = [
+            Instr('id', dest=d, type=types[d], args=[s]) for d, s in seq
+        ]
+        copies += [(where, d, s) for d, s in seq]
+
+    if coalesce_copies and copies:
+        loops = am.get(func, 'loops')
+        if coalesce(func, blocks, copies, loops.depth):
+            for block in blocks.values():
+                block[:] = [i for i in block if i.op != 'id' or
+                            i.dest != i.args[0]]
+    for name in splits:
+        if len(blocks[name]) == 1:
+            blocks.unsplit_edge(name)
+
+    func.instrs = reassemble(blocks)
+
+
+def from_ssa(bril, coalesce_copies=True):
+    for func in bril.functions:
+        func_from_ssa(func, coalesce_copies=coalesce_copies)
     return bril
 
 
 if __name__ == '__main__':
-    print(json.dumps(from_ssa(json.load(sys.stdin)), indent=2, sort_keys=True))
+    # Pass `-n` to leave the copies uncoalesced.
+    ir.dump(from_ssa(ir.load(), '-n' not in sys.argv[1:]))
@@ -0,0 +1,315 @@
+"""An in-memory representation of Bril programs.
+
+The JSON representation uses a dict for every instruction, which is
+memory-hungry and means every field access is a string-keyed lookup.
+This module defines compact classes with `__slots__` for programs,
+functions, instructions, labels, and basic blocks, and converts to and
+from the JSON form without losing anything.
+
+An absent JSON key is `None` in the corresponding attribute: `args` is
+`None` for an instruction with no `args` key but empty for an instruction
+with an empty one. The `args`, `funcs`, and `labels` of instructions are
+tuples when they are loaded from JSON, which is cheaper than lists; passes
+may replace them with any sequence but should not modify them in place,
+because instructions share their strings. Any keys this module does not
+know about are kept in an `extra` dict.
+
+Run this file to round-trip a program through the in-memory form:
+
+    $ bril2json < prog.bril | python ir.py
+"""
+
+import json
+import sys
+
+import util
+
+
+class Label:
+    __slots__ = ('label', 'extra')
+
+    # A label reads like an instruction with every field absent, so
+    # passes can check `instr.dest` and friends without a type test.
+    op = dest = type = args = funcs = labels = value = None
+
+    def __init__(self, label):
+        self.label = label
+        self.extra = None
+
+    def to_json(self):
+        out = {'label': self.label}
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+    def __repr__(self):
+        return 'Label({!r})'.format(self.label)
+
+
+class Instr:
+    __slots__ = ('op', 'dest', 'type', 'args', 'funcs', 'labels', 'value',
+                 'extra')
+
+    def __init__(self, op, dest=None, type=None, args=None, funcs=None,
+                 labels=None, value=None):
+        self.op = op
+        self.dest = dest
+        self.type = type
+        self.args = args
+        self.funcs = funcs
+        self.labels = labels
+        self.value = value
+        self.extra = None
+
+    def to_json(self):
+        out = {'op': self.op}
+        if self.dest is not None:
+            out['dest'] = self.dest
+        if self.type is not None:
+            out['type'] = self.type
+        if self.args is not None:
+            out['args'] = list(self.args)
+        if self.funcs is not None:
+            out['funcs'] = list(self.funcs)
+        if self.labels is not None:
+            out['labels'] = list(self.labels)
+        if self.value is not None:
+            out['value'] = self.value
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+    def __repr__(self):
+        return 'Instr({!r})'.format(self.to_json())
+
+
+class Arg:
+    __slots__ = ('name', 'type', 'extra')
+
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+        self.extra = None
+
+    def to_json(self):
+        out = {'name': self.name, 'type': self.type}
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+
+class Symbols:
+    """A per-function symbol table that maps names (of variables, labels,
+    and functions) to dense integer IDs and back, so analyses can use
+    lists indexed by ID instead of dicts keyed by name.
+    """
+    __slots__ = ('names', 'ids', 'counters')
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        self.counters = {}
+        for name in names:
+            self.id(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def id(self, name):
+        """Get the ID for a name, adding it to the table if it's new.
+        """
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def name(self, i):
+        return self.names[i]
+
+    def fresh(self, seed):
+        """Add a new name, starting with `seed`, to the table.
+        """
+        name = util.fresh(seed, self.ids, self.counters)
+        self.id(name)
+        return name
+
+
+def names(args, instrs):
+    """Generate all the names used in a function's arguments and
+    instructions.
+    """
+    for arg in args or ():
+        yield arg.name
+    for instr in instrs:
+        if isinstance(instr, Label):
+            yield instr.label
+            continue
+        if instr.dest is not None:
+            yield instr.dest
+        yield from instr.args or ()
+        yield from instr.funcs or ()
+        yield from instr.labels or ()
+
+
+class Function:
+    """A function. Its `symbols` table is built from the arguments and
+    instructions the first time it is used, so tools that never need it
+    do not pay for it; after that, passes that introduce new names should
+    add them.
+    """
+    __slots__ = ('name', 'args', 'type', 'instrs', '_symbols', 'extra')
+
+    def __init__(self, name, args=None, type=None, instrs=None):
+        self.name = name
+        self.args = args
+        self.type = type
+        self.instrs = [] if instrs is None else instrs
+        self._symbols = None
+        self.extra = None
+
+    @property
+    def symbols(self):
+        if self._symbols is None:
+            self._symbols = Symbols(names(self.args, self.instrs))
+        return self._symbols
+
+    def arg_names(self):
+        return [a.name for a in self.args] if self.args else []
+
+    def to_json(self):
+        out = {'name': self.name,
+               'instrs': [i.to_json() for i in self.instrs]}
+        if self.args is not None:
+            out['args'] = [a.to_json() for a in self.args]
+        if self.type is not None:
+            out['type'] = self.type
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+
+class Program:
+    __slots__ = ('functions', 'extra')
+
+    def __init__(self, functions=None):
+        self.functions = [] if functions is None else functions
+        self.extra = None
+
+    def to_json(self):
+        out = {'functions': [f.to_json() for f in self.functions]}
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+
+class Block(list):
+    """A basic block: a list of instructions that also has a name.
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name, instrs=()):
+        super(Block, self).__init__(instrs)
+        self.name = name
+
+
+# Conversion from JSON.
+
+INSTR_KEYS = frozenset(Instr.__slots__) - {'extra'}
+ARG_KEYS = frozenset(Arg.__slots__) - {'extra'}
+FUNC_KEYS = frozenset(Function.__slots__) - {'extra', '_symbols'}
+
+
+def instr_from_json(data, names=None):
+    """Convert a JSON instruction or label. Strings are deduplicated
+    through the `names` dict, if given.
+    """
+    if names is None:
+        names = {}
+    intern = names.setdefault
+
+    if 'label' in data:
+        label = Label(intern(data['label'], data['label']))
+        if len(data) > 1:
+            label.extra = {k: v for k, v in data.items() if k != 'label'}
+        return label
+
+    op = data['op']
+    instr = Instr(intern(op, op))
+    dest = data.get('dest')
+    if dest is not None:
+        instr.dest = intern(dest, dest)
+    type = data.get('type')
+    if isinstance(type, str):
+        type = intern(type, type)
+    instr.type = type
+    args = data.get('args')
+    if args is not None:
+        instr.args = tuple([intern(a, a) for a in args])
+    funcs = data.get('funcs')
+    if funcs is not None:
+        instr.funcs = tuple([intern(f, f) for f in funcs])
+    labels = data.get('labels')
+    if labels is not None:
+        instr.labels = tuple([intern(lb, lb) for lb in labels])
+    instr.value = data.get('value')
+    if not INSTR_KEYS.issuperset(data):
+        instr.extra = {k: v for k, v in data.items() if k not in INSTR_KEYS}
+    return instr
+
+
+def arg_from_json(data):
+    arg = Arg(data['name'], data['type'])
+    if not ARG_KEYS.issuperset(data):
+        arg.extra = {k: v for k, v in data.items() if k not in ARG_KEYS}
+    return arg
+
+
+def func_from_json(data, names=None):
+    if names is None:
+        names = {}
+    args = data.get('args')
+    func = Function(
+        data['name'],
+        None if args is None else [arg_from_json(a) for a in args],
+        data.get('type'),
+        [instr_from_json(i, names) for i in data['instrs']],
+    )
+    if not FUNC_KEYS.issuperset(data):
+        func.extra = {k: v for k, v in data.items() if k not in FUNC_KEYS}
+    return func
+
+
+def from_json(data):
+    """Convert a JSON program.
+    """
+    names = {}
+    prog = Program([func_from_json(f, names) for f in data['functions']])
+    if len(data) > 1:
+        prog.extra = {k: v for k, v in data.items() if k != 'functions'}
+    return prog
+
+
+# Input and output.
+
+def load(f=None):
+    """Load a program (in JSON or the binary format) from a stream,
+    standard input by default.
+    """
+    return from_json(util.load(f))
+
+
+def dump(prog, f=None):
+    """Write a program as JSON to a stream, standard output by default.
+    """
+    f = f or sys.stdout
+    json.dump(prog.to_json(), f, indent=2, sort_keys=True)
+    f.write('\n')
+
+
+if __name__ == '__main__':
+    # Round-trip a program through the in-memory form.
+    dump(load())
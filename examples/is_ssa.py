@@ -1,5 +1,4 @@
-import json
-import sys
+import ir
 
 
 def is_ssa(bril):
@@ -7,16 +6,16 @@ def is_ssa(bril):
 
     Every function in the program may assign to each variable once.
     """
-    for func in bril['functions']:
+    for func in bril.functions:
         assigned = set()
-        for instr in func['instrs']:
-            if 'dest' in instr:
-                if instr['dest'] in assigned:
+        for instr in func.instrs:
+            if instr.dest is not None:
+                if instr.dest in assigned:
                     return False
                 else:
-                    assigned.add(instr['dest'])
+                    assigned.add(instr.dest)
     return True
 
 
 if __name__ == '__main__':
-    print('yes' if is_ssa(json.load(sys.stdin)) else 'no')
+    print('yes' if is_ssa(ir.load()) else 'no')
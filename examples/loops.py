@@ -0,0 +1,183 @@
+"""Find the natural loops in each function and how they nest.
+
+A back edge is an edge from a block to one of its dominators (the
+loop's header). The natural loop of a header is the header plus every
+block that can reach one of its back edges without going through the
+header. Two loops are either disjoint or one is nested inside the other,
+so together they form a forest. (A cycle that can be entered at more
+than one block, in an irreducible graph, has no back edge, so it is not
+a natural loop.)
+
+    $ bril2json < prog.bril | python loops.py
+
+prints each loop, indented by its depth, with its blocks, the blocks
+with back edges to its header (its latches), the edges that leave it,
+and its preheader.
+"""
+
+from cfg import CFG, block_map, add_terminators, add_entry
+from dom import DomTree, graph_idom
+from form_blocks import form_blocks
+import ir
+
+
+class Loop:
+    """A natural loop. Blocks are referred to by name. `blocks` includes
+    the blocks of the loops nested in this one. `exits` lists the edges
+    (pairs of names) from a block in the loop to one outside it. The
+    `preheader` is the header's only predecessor outside the loop, if it
+    has just one and the header is its only successor (and otherwise
+    `None`). `depth` is 1 for an outermost loop.
+    """
+    def __init__(self, header):
+        self.header = header
+        self.blocks = set()
+        self.latches = []
+        self.exits = []
+        self.preheader = None
+        self.parent = None
+        self.children = []
+        self.depth = 1
+
+    def __repr__(self):
+        return '<Loop {} depth {}>'.format(self.header, self.depth)
+
+
+class LoopForest:
+    """The natural loops of a `CFG`. `loops` lists every loop, outer
+    loops before the loops inside them, and `roots` lists the outermost
+    ones. `innermost` maps the name of each block in a loop to the
+    innermost loop that contains it.
+    """
+    def __init__(self, loops, innermost):
+        self.loops = loops
+        self.roots = [loop for loop in loops if loop.parent is None]
+        self.innermost = innermost
+
+    def __iter__(self):
+        return iter(self.loops)
+
+    def __len__(self):
+        return len(self.loops)
+
+    def depth(self, name):
+        """The number of loops that contain a block (0 outside every
+        loop).
+        """
+        loop = self.innermost.get(name)
+        return loop.depth if loop else 0
+
+
+def find_loops(graph, domtree):
+    """Find the natural loops of a `CFG`, given its `dom.DomTree`, as a
+    `LoopForest`.
+
+    Headers are visited in reverse preorder on the dominator tree, so
+    inner loops are found before the loops around them. When the walk
+    backward from an outer loop's latches reaches a block that is
+    already in a loop, it skips straight to that loop's outermost
+    enclosing loop found so far, which becomes a child of the new loop.
+    Each block is added to just one loop that way.
+    """
+    names = graph.names
+    pre = domtree.pre
+    reachable = [p != -1 for p in pre]
+    headers = sorted((node for node in range(len(graph)) if reachable[node]),
+                     key=lambda node: pre[node], reverse=True)
+
+    loops = []
+    own = []  # The blocks in each loop but not in the loops inside it.
+    innermost = [-1] * len(graph)
+    parent = []
+
+    def outermost(node):
+        i = innermost[node]
+        while parent[i] != -1:
+            i = parent[i]
+        return i
+
+    for header in headers:
+        latches = [p for p in graph.predecessors(header)
+                   if reachable[p] and domtree.dominates(header, p)]
+        if not latches:
+            continue
+        i = len(loops)
+        loop = Loop(names[header])
+        loop.latches = sorted({names[p] for p in latches})
+        loops.append(loop)
+        parent.append(-1)
+        own.append([header])
+        innermost[header] = i
+
+        worklist = [p for p in latches if p != header]
+        while worklist:
+            node = worklist.pop()
+            if innermost[node] == -1:
+                innermost[node] = i
+                own[i].append(node)
+                worklist += [p for p in graph.predecessors(node)
+                             if reachable[p]]
+                continue
+            inner = outermost(node)
+            if inner != i:
+                parent[inner] = i
+                worklist += [p for p in graph.predecessors(
+                    graph.index[loops[inner].header]) if reachable[p]]
+
+    # Inner loops come first, so their blocks are complete by the time
+    # the loops around them need them.
+    for i, loop in enumerate(loops):
+        loop.blocks.update(names[node] for node in own[i])
+        if parent[i] != -1:
+            outer = loops[parent[i]]
+            loop.parent = outer
+            outer.children.append(loop)
+            outer.blocks |= loop.blocks
+
+    for loop in loops:
+        header = graph.index[loop.header]
+        for name in loop.blocks:
+            for s in graph.successors(graph.index[name]):
+                if names[s] not in loop.blocks:
+                    loop.exits.append((name, names[s]))
+        loop.exits.sort()
+        outside = [p for p in graph.predecessors(header)
+                   if names[p] not in loop.blocks]
+        if len(outside) == 1 and len(graph.successors(outside[0])) == 1:
+            loop.preheader = names[outside[0]]
+
+    forest = {names[node]: loops[i]
+              for node, i in enumerate(innermost) if i != -1}
+
+    # Number the depths and list the loops from the outside in.
+    loops.reverse()
+    for loop in loops:
+        if loop.parent:
+            loop.depth = loop.parent.depth + 1
+        loop.children.sort(key=lambda child: pre[graph.index[child.header]])
+    loops.sort(key=lambda loop: pre[graph.index[loop.header]])
+    return LoopForest(loops, forest)
+
+
+def print_loops(bril):
+    for func in bril.functions:
+        blocks = block_map(form_blocks(func.instrs))
+        add_entry(blocks)
+        add_terminators(blocks)
+        graph = CFG.from_blocks(blocks)
+        forest = find_loops(graph, DomTree(graph, graph_idom(graph)))
+
+        print('@{}'.format(func.name))
+        for loop in forest:
+            print('{}{}: blocks {}; latches {}; exits {}; preheader {}'.format(
+                '  ' * loop.depth,
+                loop.header,
+                ' '.join(sorted(loop.blocks)),
+                ' '.join(loop.latches),
+                ' '.join('{}->{}'.format(a, b) for a, b in loop.exits),
+                loop.preheader or '-',
+            ))
+
+
+if __name__ == '__main__':
+    print_loops(ir.load())
@@ -1,11 +1,11 @@
 """Local value numbering for Bril.
 """
-import json
 import sys
 from collections import namedtuple
 
 from form_blocks import form_blocks
 from util import flatten
+import ir
 
 # A Value uniquely represents a computation in terms of sub-values.
 Value = namedtuple('Value', ['op', 'args'])
@@ -42,11 +42,11 @@ def last_writes(instrs):
     out = [False] * len(instrs)
     seen = set()
     for idx, instr in reversed(list(enumerate(instrs))):
-        if 'dest' in instr:
-            dest = instr['dest']
+        if instr.dest is not None:
+            dest = instr.dest
             if dest not in seen:
                 out[idx] = True
-                seen.add(instr['dest'])
+                seen.add(instr.dest)
     return out
 
 
@@ -57,9 +57,10 @@ def read_first(instrs):
     read = set()
     written = set()
     for instr in instrs:
-        read.update(set(instr.get('args', [])) - written)
-        if 'dest' in instr:
-            written.add(instr['dest'])
+        if instr.args:
+            read.update(set(instr.args) - written)
+        if instr.dest is not None:
+            written.add(instr.dest)
     return read
 
 
@@ -104,7 +105,7 @@ def lvn_block(block, lookup, canonicalize, fold):
     for instr, last_write in zip(block, last_writes(block)):
         # Look up the value numbers for all variable arguments,
         # generating new numbers for unseen variables.
-        argvars = instr.get('args', [])
+        argvars = instr.args or ()
         argnums = tuple(var2num[var] for var in argvars)
 
         # Non-call value operations are candidates for replacement. (We
@@ -112,41 +113,38 @@ def lvn_block(block, lookup, canonicalize, fold):
         # but determining purity would require an interprocedural
         # analysis.)
         val = None
-        if 'dest' in instr and 'args' in instr and instr['op'] != 'call':
+        if (instr.dest is not None and instr.args is not None and
+                instr.op != 'call'):
             # Construct a Value for this computation.
-            val = canonicalize(Value(instr['op'], argnums))
+            val = canonicalize(Value(instr.op, argnums))
 
             # Is this value already available?
             num = lookup(value2num, val)
             if num is not None:
                 # Mark this variable as containing the value.
-                var2num[instr['dest']] = num
+                var2num[instr.dest] = num
 
                 # Replace the instruction with a copy or a constant.
                 if num in num2const:  # Value is a constant.
-                    instr.update({
-                        'op': 'const',
-                        'value': num2const[num],
-                    })
-                    del instr['args']
+                    instr.op = 'const'
+                    instr.value = num2const[num]
+                    instr.args = None
                 else:  # Value is in a variable.
-                    instr.update({
-                        'op': 'id',
-                        'args': [num2var[num]],
-                    })
+                    instr.op = 'id'
+                    instr.args = [num2var[num]]
                 continue
 
         # If this instruction produces a result, give it a number.
-        if 'dest' in instr:
-            newnum = var2num.add(instr['dest'])
+        if instr.dest is not None:
+            newnum = var2num.add(instr.dest)
 
             # Record constant values.
-            if instr['op'] == 'const':
-                num2const[newnum] = instr['value']
+            if instr.op == 'const':
+                num2const[newnum] = instr.value
 
             if last_write:
                 # Preserve the variable name for other blocks.
-                var = instr['dest']
+                var = instr.dest
             else:
                 # We must put the value in a new variable so it can be
                 # reused by another computation in the feature (in case
@@ -155,18 +153,16 @@ def lvn_block(block, lookup, canonicalize, fold):
 
             # Record the variable name and update the instruction.
             num2var[newnum] = var
-            instr['dest'] = var
+            instr.dest = var
 
             if val:
                 # Is this value foldable to a constant?
                 const = fold(num2const, val)
                 if const:
                     num2const[newnum] = const
-                    instr.update({
-                        'op': 'const',
-                        'value': const,
-                    })
-                    del instr['args']
+                    instr.op = 'const'
+                    instr.value = const
+                    instr.args = None
                     continue
 
                 # If not, record the new variable as the canonical
@@ -174,8 +170,8 @@ def lvn_block(block, lookup, canonicalize, fold):
                 value2num[val] = newnum
 
         # Update argument variable names to canonical variables.
-        if 'args' in instr:
-            instr['args'] = [num2var[n] for n in argnums]
+        if instr.args is not None:
+            instr.args = [num2var[n] for n in argnums]
 
 
 def _lookup(value2num, value):
@@ -225,8 +221,8 @@ def lvn(bril, prop=False, canon=False, fold=False):
     """Apply the local value numbering optimization to every basic block
     in every function.
     """
-    for func in bril['functions']:
-        blocks = list(form_blocks(func['instrs']))
+    for func in bril.functions:
+        blocks = list(form_blocks(func.instrs))
         for block in blocks:
             lvn_block(
                 block,
@@ -234,10 +230,15 @@ def lvn(bril, prop=False, canon=False, fold=False):
                 canonicalize=_canonicalize if canon else lambda v: v,
                 fold=_fold if fold else lambda n2c, v: None,
             )
-        func['instrs'] = flatten(blocks)
+        func.instrs = flatten(blocks)
+
+        # Add the new `lvn.N` variables to the symbol table.
+        for instr in func.instrs:
+            if instr.dest is not None:
+                func.symbols.id(instr.dest)
 
 
 if __name__ == '__main__':
-    bril = json.load(sys.stdin)
+    bril = ir.load()
     lvn(bril, '-p' in sys.argv, '-c' in sys.argv, '-f' in sys.argv)
-    json.dump(bril, sys.stdout, indent=2, sort_keys=True)
+    ir.dump(bril)
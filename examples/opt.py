@@ -0,0 +1,219 @@
+"""Run a pipeline of optimization passes in a single process.
+
+Instead of chaining the example scripts with pipes, which serializes
+and re-parses the program between every pair of stages, give this
+script a comma-separated list of passes to run on the program in
+order:
+
+    $ bril2json < prog.bril | python opt.py 'to_ssa,lvn(pcf),tdce+,from_ssa'
+
+A pass may take flags in parentheses. The `lvn` flags are `p`, `c`, and
+`f`, meaning the same as `-p`, `-c`, and `-f` for `lvn.py`, and the
+`to_ssa` flags are `p` and `s`, for pruned and semi-pruned SSA, like
+`-p` and `-s` for `to_ssa.py`. The available passes are in `PASSES`.
+
+Analyses (like dominators) are cached between passes in an
+`analyses.AnalysisManager`. Every pass declares which analyses it
+preserves, and the rest are thrown away after the pass runs.
+
+All the passes work on one function at a time, so with `--jobs N` (or
+`--jobs=N` or `-j N`) the functions are split into chunks of about the
+same size and optimized in a pool of N worker processes. The output is
+the same as without it, in the same order:
+
+    $ bril2json < prog.bril | python opt.py --jobs 8 'to_ssa,lvn,from_ssa'
+"""
+
+import re
+import sys
+
+from analyses import AnalysisManager, ALL, INSTRS, SHAPE
+import cfg
+import from_ssa
+import ir
+import lvn
+import sccp
+import tdce
+import to_ssa
+
+
+def _lvn(bril, flags, am):
+    lvn.lvn(bril, 'p' in flags, 'c' in flags, 'f' in flags)
+
+
+def _to_ssa(bril, flags, am):
+    mode = 'pruned' if 'p' in flags else 'semi' if 's' in flags else \
+        'minimal'
+    for func in bril.functions:
+        to_ssa.func_to_ssa(func, am, mode)
+
+
+def _merge(bril, flags, am):
+    for func in bril.functions:
+        graph = am.get(func, 'cfg')
+        cfg.merge_chains(graph)
+        func.instrs = cfg.reassemble(graph)
+
+
+def _per_func(modify_func, uses_analyses=False):
+    """Make a pass from a function that modifies a single function (and
+    takes an `AnalysisManager`, if `uses_analyses`).
+    """
+    def run(bril, flags, am):
+        for func in bril.functions:
+            if uses_analyses:
+                modify_func(func, am)
+            else:
+                modify_func(func)
+    return run
+
+
+# Every pass takes a program (which it modifies in place), a string of
+# flags, and an `AnalysisManager`. Each pass also gets the set of flags
+# it understands and the set of analyses it preserves.
+PASSES = {
+    'lvn': (_lvn, set('pcf'), SHAPE),
+    'to_ssa': (_to_ssa, set('ps'), ALL - INSTRS),
+    'from_ssa': (_per_func(from_ssa.func_from_ssa, True), set(),
+                 ALL - INSTRS),
+    # Edits the `cfg` through its methods, so the shape analyses notice
+    # when it deletes blocks or edges.
+    'sccp': (_per_func(sccp.func_sccp, True), set(), ALL - INSTRS),
+    # Likewise for merging blocks.
+    'merge': (_merge, set(), ALL - INSTRS),
+}
+for name, modify_func in tdce.MODES.items():
+    # Deleting instructions can delete whole (unreachable) blocks.
+    PASSES[name] = (_per_func(modify_func), set(), frozenset())
+
+PASS_RE = re.compile(r'\s*([\w+]+)\s*(?:\(([^()]*)\))?\s*(?:,|$)')
+
+
+def parse_pipeline(spec):
+    """Parse a pipeline string into a list of (name, flags) pairs.
+    Raise a ValueError if the pipeline is malformed or refers to an
+    unknown pass.
+    """
+    pipeline = []
+    pos = 0
+    while pos < len(spec):
+        match = PASS_RE.match(spec, pos)
+        if not match:
+            raise ValueError('malformed pipeline at "{}"'.format(spec[pos:]))
+        name, flags = match.group(1), match.group(2) or ''
+        if name not in PASSES:
+            raise ValueError('unknown pass "{}"'.format(name))
+        bad = set(flags) - PASSES[name][1]
+        if bad:
+            raise ValueError('unknown flags "{}" for pass "{}"'.format(
+                ''.join(sorted(bad)), name,
+            ))
+        pipeline.append((name, flags))
+        pos = match.end()
+    return pipeline
+
+
+def run_pipeline(bril, pipeline, am=None):
+    """Run a parsed pipeline on a program, modifying it in place.
+    """
+    if am is None:
+        am = AnalysisManager()
+    for name, flags in pipeline:
+        run, _, preserve = PASSES[name]
+        run(bril, flags, am)
+        for func in bril.functions:
+            am.invalidate(func, preserve)
+    return bril
+
+
+# The number of chunks to make for each worker process. Having a few
+# lets the pool even out chunks that take longer than their size
+# suggests.
+CHUNKS_PER_JOB = 4
+
+
+def chunk_funcs(funcs, count):
+    """Split a list of functions into at most `count` lists with about
+    the same number of instructions, biggest first. Each list holds
+    (position, function) pairs.
+    """
+    order = sorted(range(len(funcs)), key=lambda i: -len(funcs[i].instrs))
+    chunks = [[] for _ in range(min(count, len(funcs)))]
+    sizes = [0] * len(chunks)
+    for i in order:
+        # Put the next biggest function in the smallest chunk.
+        c = sizes.index(min(sizes))
+        chunks[c].append((i, funcs[i]))
+        sizes[c] += len(funcs[i].instrs)
+    return [chunks[c] for c in sorted(range(len(chunks)),
+                                      key=lambda c: -sizes[c])]
+
+
+def _run_chunk(pipeline, chunk):
+    """Run a pipeline on a chunk of functions (in a worker process).
+    """
+    prog = ir.Program([func for _, func in chunk])
+    run_pipeline(prog, pipeline)
+    return [(i, func) for (i, _), func in zip(chunk, prog.functions)]
+
+
+def run_parallel(bril, pipeline, jobs):
+    """Run a parsed pipeline on a program like `run_pipeline`, on `jobs`
+    worker processes.
+    """
+    if jobs <= 1 or len(bril.functions) <= 1:
+        return run_pipeline(bril, pipeline)
+
+    from concurrent.futures import ProcessPoolExecutor
+    chunks = chunk_funcs(bril.functions, jobs * CHUNKS_PER_JOB)
+    with ProcessPoolExecutor(min(jobs, len(chunks))) as pool:
+        futures = [pool.submit(_run_chunk, pipeline, chunk)
+                   for chunk in chunks]
+        for future in futures:
+            for i, func in future.result():
+                bril.functions[i] = func
+    return bril
+
+
+USAGE = 'usage: opt.py [-j N | --jobs N | --jobs=N] PIPELINE'
+
+
+def parse_args(args):
+    """Get the pipeline string and the number of jobs from the
+    command-line arguments. Raise a ValueError for bad arguments.
+    """
+    jobs = 1
+    rest = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in ('-j', '--jobs'):
+            name, value = arg, args.pop(0) if args else ''
+        elif arg.startswith('--jobs='):
+            name, value = arg.split('=', 1)
+        elif arg.startswith('-j'):
+            name, value = '-j', arg[2:]
+        else:
+            rest.append(arg)
+            continue
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError('{} needs a positive number, not {!r}'.format(
+                name, value))
+        jobs = int(value)
+    if len(rest) > 1:
+        raise ValueError('expected one pipeline, got {}'.format(len(rest)))
+    return (rest[0] if rest else ''), jobs
+
+
+if __name__ == '__main__':
+    try:
+        spec, jobs = parse_args(sys.argv[1:])
+    except ValueError as e:
+        sys.exit('error: {}\n{}'.format(e, USAGE))
+    try:
+        pipeline = parse_pipeline(spec)
+        # Passes raise a ValueError for input they can't handle, like
+        # `sccp` on a program that is not in SSA form.
+        ir.dump(run_parallel(ir.load(), pipeline, jobs))
+    except ValueError as e:
+        sys.exit('error: {}'.format(e))
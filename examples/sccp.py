@@ -0,0 +1,234 @@
+"""Sparse conditional constant propagation (Wegman and Zadeck) for
+programs in SSA form, like the output of `to_ssa.py`.
+
+Every variable starts out unknown (it might still turn out to be any
+constant) and can only go down the lattice to a single constant and then
+to `OVERDEFINED`. Two worklists drive the analysis: one of control-flow
+edges that have just been found to be executable, and one of
+instructions that use a variable whose value has just gone down. An
+instruction is only evaluated once its block is executable, and a
+phi-node only looks at the arguments that come in along executable
+edges, so constants flow around loops and through branches that can
+never go the other way.
+
+Afterward, instructions that compute a constant become `const`
+instructions, branches on constants become jumps, and blocks that can
+never run are deleted. (The now-unused instructions are left for
+`tdce.py` to clean up.)
+"""
+
+import sys
+
+from analyses import AnalysisManager
+from cfg import reassemble
+from ir import Instr
+import ir
+
+# The bottom of the lattice: a variable that can have more than one
+# value. (The top of the lattice, "unknown," is a variable with no entry
+# in the `values` dict.)
+OVERDEFINED = object()
+
+
+def _wrap(n):
+    """Wrap an integer to 64 bits, like the reference interpreter.
+    """
+    n &= (1 << 64) - 1
+    return n - (1 << 64) if n >= 1 << 63 else n
+
+
+def _div(a, b):
+    if b == 0:
+        raise ZeroDivisionError()
+    q = abs(a) // abs(b)
+    return _wrap(q if (a >= 0) == (b >= 0) else -q)
+
+
+FOLDABLE = {
+    'add': lambda a, b: _wrap(a + b),
+    'sub': lambda a, b: _wrap(a - b),
+    'mul': lambda a, b: _wrap(a * b),
+    'div': _div,
+    'eq': lambda a, b: a == b,
+    'lt': lambda a, b: a < b,
+    'gt': lambda a, b: a > b,
+    'le': lambda a, b: a <= b,
+    'ge': lambda a, b: a >= b,
+    'not': lambda a: not a,
+    'and': lambda a, b: a and b,
+    'or': lambda a, b: a or b,
+}
+
+# The types whose constants this pass tracks.
+TYPES = {'int': int, 'bool': bool}
+
+
+def same(a, b):
+    """Check whether two lattice values are the same. (An int is never
+    the same as a bool.)
+    """
+    return a is b or (type(a) is type(b) and a == b)
+
+
+def meet(a, b):
+    """Combine two lattice values (where `None` is unknown).
+    """
+    if a is None:
+        return b
+    if b is None or same(a, b):
+        return a
+    return OVERDEFINED
+
+
+def evaluate(instr, block, values, edges):
+    """Compute the lattice value of an instruction's destination.
+    """
+    if instr.op == 'const':
+        if type(instr.value) is TYPES.get(instr.type):
+            return instr.value
+        return OVERDEFINED
+
+    if instr.op == 'phi':
+        val = None
+        for label, arg in zip(instr.labels, instr.args):
+            if (label, block) in edges:
+                val = meet(val, values.get(arg))
+        return val
+
+    if instr.op == 'id':
+        return values.get(instr.args[0])
+
+    if instr.op in FOLDABLE:
+        args = [values.get(arg) for arg in instr.args]
+        if any(a is OVERDEFINED for a in args):
+            return OVERDEFINED
+        if any(a is None for a in args):
+            return None
+        try:
+            return FOLDABLE[instr.op](*args)
+        except ZeroDivisionError:
+            return OVERDEFINED
+
+    return OVERDEFINED
+
+
+def sccp(blocks, entry, index):
+    """Run the analysis on a block map in SSA form, with its def-use
+    chains (a `defuse.DefUse`). Return the lattice value of each variable
+    and the sets of executable blocks and edges (pairs of block names).
+    Variables that are never defined (like the function's arguments) are
+    `OVERDEFINED`.
+    """
+    values = {v: OVERDEFINED for v in index.uses if v not in index.defs}
+
+    executable = set()
+    edges = set()
+    flow = [(None, entry)]
+    ssa = []
+
+    def visit(name, instr):
+        if instr.op == 'jmp':
+            flow.append((name, instr.labels[0]))
+        elif instr.op == 'br':
+            cond = values.get(instr.args[0])
+            if cond is OVERDEFINED:
+                flow.extend((name, label) for label in instr.labels)
+            elif cond is not None:
+                flow.append((name, instr.labels[0 if cond else 1]))
+        elif instr.dest is not None:
+            val = evaluate(instr, name, values, edges)
+            if val is not None and not same(val, values.get(instr.dest)):
+                values[instr.dest] = val
+                ssa.extend(index.users(instr.dest))
+
+    while flow or ssa:
+        if flow:
+            edge = flow.pop()
+            if edge in edges:
+                continue
+            edges.add(edge)
+            name = edge[1]
+            if name in executable:
+                # Only the phi-nodes can see the new edge.
+                for instr in blocks[name]:
+                    if instr.op == 'phi':
+                        visit(name, instr)
+            else:
+                executable.add(name)
+                for instr in blocks[name]:
+                    visit(name, instr)
+        else:
+            instr = ssa.pop()
+            name = index.where[instr]
+            if name in executable:
+                visit(name, instr)
+
+    return values, executable, edges
+
+
+def func_sccp(func, am=None):
+    """Optimize a function in SSA form, editing the `cfg` analysis from
+    `am` (a `FlowGraph`) in place. Raise a ValueError if the function
+    assigns any variable more than once.
+    """
+    if am is None:
+        am = AnalysisManager()
+    graph = am.get(func, 'cfg')
+    if not graph:
+        return
+
+    try:
+        index = am.get(func, 'def_use')
+    except ValueError:
+        raise ValueError('{} is not in SSA form'.format(func.name))
+
+    values, executable, edges = sccp(graph, next(iter(graph)), index)
+
+    for name in executable:
+        block = graph[name]
+        for i, instr in enumerate(block):
+            if instr.op == 'phi':
+                pairs = [(label, arg)
+                         for label, arg in zip(instr.labels, instr.args)
+                         if (label, name) in edges]
+                instr.labels = [label for label, _ in pairs]
+                instr.args = [arg for _, arg in pairs]
+            val = values.get(instr.dest)
+            if instr.dest is not None and instr.op != 'const' and \
+                    val is not None and val is not OVERDEFINED:
+                new = Instr('const', dest=instr.dest, type=instr.type,
+                            value=val)
+                new.extra = instr.extra
+                block[i] = new
+
+        term = block[-1]
+        if term.op == 'br':
+            cond = values.get(term.args[0])
+            if cond is not None and cond is not OVERDEFINED:
+                jmp = Instr('jmp', labels=[term.labels[0 if cond else 1]])
+                jmp.extra = term.extra
+                graph.set_terminator(name, jmp)
+
+    # Delete the blocks that can never run. Only other dead blocks can
+    # jump to them.
+    dead = [name for name in graph if name not in executable]
+    for name in dead:
+        for succ in list(graph.succ[name]):
+            graph.remove_edge(name, succ)
+    for name in dead:
+        graph.remove_block(name)
+
+    func.instrs = reassemble(graph)
+
+
+def run_sccp(bril):
+    for func in bril.functions:
+        func_sccp(func)
+    return bril
+
+
+if __name__ == '__main__':
+    try:
+        ir.dump(run_sccp(ir.load()))
+    except ValueError as e:
+        sys.exit('error: {}'.format(e))
@@ -3,9 +3,10 @@ local optimization.
 """
 
 import sys
-import json
+from defuse import DefUse
 from form_blocks import form_blocks
 from util import flatten
+import ir
 
 
 def trivial_dce_pass(func):
@@ -13,7 +14,7 @@ def trivial_dce_pass(func):
     to any other instruction. Return a bool indicating whether we deleted
     anything.
     """
-    blocks = list(form_blocks(func['instrs']))
+    blocks = list(form_blocks(func.instrs))
 
     # Find all the variables used as an argument to any instruction,
     # even once.
@@ -21,17 +22,18 @@ def trivial_dce_pass(func):
     for block in blocks:
         for instr in block:
             # Mark all the variable arguments as used.
-            used.update(instr.get('args', []))
+            if instr.args:
+                used.update(instr.args)
 
     # Delete the instructions that write to unused variables.
     changed = False
     for block in blocks:
         # Avoid deleting *effect instructions* that do not produce a
-        # result. The `'dest' in i` predicate is true for all the *value
-        # functions*, which are pure and can be eliminated if their
-        # results are never used.
+        # result. The `i.dest is not None` predicate is true for all the
+        # *value functions*, which are pure and can be eliminated if
+        # their results are never used.
         new_block = [i for i in block
-                     if 'dest' not in i or i['dest'] in used]
+                     if i.dest is None or i.dest in used]
 
         # Record whether we deleted anything.
         changed |= len(new_block) != len(block)
@@ -40,7 +42,7 @@ def trivial_dce_pass(func):
         block[:] = new_block
 
     # Reassemble the function.
-    func['instrs'] = flatten(blocks)
+    func.instrs = flatten(blocks)
 
     return changed
 
@@ -70,15 +72,15 @@ def drop_killed_local(block):
     for i, instr in enumerate(block):
         # Check for uses. Anything we use is no longer a candidate for
         # deletion.
-        for var in instr.get('args', []):
+        for var in instr.args or ():
             if var in last_def:
                 del last_def[var]
 
         # Check for definitions. This *has* to happen after the use
         # check, so we don't count "a = a + 1" as killing a before using
         # it.
-        if 'dest' in instr:
-            dest = instr['dest']
+        if instr.dest is not None:
+            dest = instr.dest
             if dest in last_def:
                 # Another definition since the most recent use. Drop the
                 # last definition.
@@ -97,11 +99,11 @@ def drop_killed_pass(func):
     """Drop killed functions from *all* blocks. Return a bool indicating
     whether anything changed.
     """
-    blocks = list(form_blocks(func['instrs']))
+    blocks = list(form_blocks(func.instrs))
     changed = False
     for block in blocks:
         changed |= drop_killed_local(block)
-    func['instrs'] = flatten(blocks)
+    func.instrs = flatten(blocks)
     return changed
 
 
@@ -112,11 +114,34 @@ def trivial_dce_plus(func):
         pass
 
 
+def ssa_dce(func):
+    """Like `trivial_dce`, for a function in SSA form, using its def-use
+    chains. Deleting an instruction can only make the definitions of its
+    arguments dead, so only those are looked at again, instead of the
+    whole function.
+    """
+    blocks = dict(enumerate(form_blocks(func.instrs)))
+    index = DefUse(blocks, func.arg_names())
+
+    deleted = set()
+    work = [v for v in index.defs if index.is_dead(v)]
+    while work:
+        var = work.pop()
+        instr = index.defs.get(var)
+        if instr is not None and index.is_dead(var):
+            deleted.add(instr)
+            work += index.remove(instr)
+
+    func.instrs = flatten([i for i in block if i not in deleted]
+                          for block in blocks.values())
+
+
 MODES = {
     'tdce': trivial_dce,
     'tdcep': trivial_dce_pass,
     'dkp': drop_killed_pass,
     'tdce+': trivial_dce_plus,
+    'ssa_dce': ssa_dce,
 }
 
 
@@ -127,10 +152,14 @@ def localopt():
         modify_func = trivial_dce
 
     # Apply the change to all the functions in the input program.
-    bril = json.load(sys.stdin)
-    for func in bril['functions']:
-        modify_func(func)
-    json.dump(bril, sys.stdout, indent=2, sort_keys=True)
+    bril = ir.load()
+    try:
+        for func in bril.functions:
+            modify_func(func)
+    except ValueError as e:
+        # `ssa_dce` needs a function in SSA form.
+        sys.exit('error: {}'.format(e))
+    ir.dump(bril)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,11 @@
-import json
-import sys
 from collections import defaultdict
+import sys
 
-from cfg import block_map, successors, add_terminators, add_entry, reassemble
-from form_blocks import form_blocks
-from dom import get_dom, dom_fronts, dom_tree, map_inv
+from analyses import AnalysisManager
+from cfg import reassemble
+from dom import idom_arg, iterated_frontier, walk_tree
+from ir import Instr
+import ir
 
 
 def def_blocks(blocks):
@@ -13,81 +14,146 @@ def def_blocks(blocks):
     out = defaultdict(set)
     for name, block in blocks.items():
         for instr in block:
-            if 'dest' in instr:
-                out[instr['dest']].add(name)
+            if instr.dest is not None:
+                out[instr.dest].add(name)
     return dict(out)
 
 
-def get_phis(blocks, df, defs):
+def global_names(blocks):
+    """Get the set of variables that are used in some block before they
+    are assigned in that block. Only these can be live on entry to a
+    block, so only they can need phi-nodes.
+    """
+    out = set()
+    for block in blocks.values():
+        assigned = set()
+        for instr in block:
+            out.update(arg for arg in instr.args or ()
+                       if arg not in assigned)
+            if instr.dest is not None:
+                assigned.add(instr.dest)
+    return out
+
+
+def get_phis(blocks, df, defs, live_in=None):
     """Find where to insert phi-nodes in the blocks.
 
     Produce a map from block names to variable names that need phi-nodes
     in those blocks. (We will need to generate names and actually insert
-    instructions later.)
+    instructions later.) Each variable needs them in the iterated
+    dominance frontier of the blocks that assign it. Given `live_in`, a
+    map from block names to the variables that are live on entry to
+    them, leave out the phi-nodes for variables that are dead there.
     """
     phis = {b: set() for b in blocks}
     for v, v_defs in defs.items():
-        v_defs_list = list(v_defs)
-        for d in v_defs_list:
-            for block in df[d]:
-                # Add a phi-node...
-                if v not in phis[block]:
-                    # ..unless we already did.
-                    phis[block].add(v)
-                    if block not in v_defs_list:
-                        v_defs_list.append(block)
+        for block in iterated_frontier(df, v_defs):
+            if live_in is None or v in live_in[block]:
+                phis[block].add(v)
     return phis
 
 
-def ssa_rename(blocks, phis, succ, domtree, args):
-    stack = defaultdict(list, {v: [v] for v in args})
+def ssa_rename(blocks, phis, succ, domtree, args, symbols):
+    """Rename every variable so it is assigned once, and compute the
+    arguments and destinations of the phi-nodes.
+
+    The rename stacks (and the counters for new names) are lists
+    indexed by the variables' IDs in the function's symbol table. The
+    current name of a variable is at the end of its stack. Each block
+    logs the IDs of the stacks it pushes to, and pops them again when
+    the walk leaves it, so renaming takes time linear in the size of
+    the function.
+    """
+    ids = symbols.ids
+    stack = [[] for _ in range(len(symbols))]
+    for v in args:
+        stack[ids[v]] = [v]
     phi_args = {b: {p: [] for p in phis[b]} for b in blocks}
     phi_dests = {b: {p: None for p in phis[b]} for b in blocks}
-    counters = defaultdict(int)
-
-    def _push_fresh(var):
-        fresh = '{}.{}'.format(var, counters[var])
-        counters[var] += 1
-        stack[var].insert(0, fresh)
+    counters = [0] * len(symbols)
+
+    def _push_fresh(var, pushed):
+        i = ids[var]
+        fresh = '{}.{}'.format(var, counters[i])
+        counters[i] += 1
+        stack[i].append(fresh)
+        pushed.append(i)
+        symbols.id(fresh)
         return fresh
 
     def _rename(block):
-        # Save stacks.
-        old_stack = {k: list(v) for k, v in stack.items()}
+        """Rename a block and return the log of the stacks it pushed
+        to.
+        """
+        pushed = []
 
         # Rename phi-node destinations.
         for p in phis[block]:
-            phi_dests[block][p] = _push_fresh(p)
+            phi_dests[block][p] = _push_fresh(p, pushed)
 
         for instr in blocks[block]:
             # Rename arguments in normal instructions.
-            if 'args' in instr:
-                new_args = [stack[arg][0] for arg in instr['args']]
-                instr['args'] = new_args
+            if instr.args is not None:
+                new_args = [stack[ids[arg]][-1] for arg in instr.args]
+                instr.args = new_args
 
             # Rename destinations.
-            if 'dest' in instr:
-                instr['dest'] = _push_fresh(instr['dest'])
+            if instr.dest is not None:
+                instr.dest = _push_fresh(instr.dest, pushed)
 
         # Rename phi-node arguments (in successors).
         for s in succ[block]:
             for p in phis[s]:
-                if stack[p]:
-                    phi_args[s][p].append((block, stack[p][0]))
+                if stack[ids[p]]:
+                    phi_args[s][p].append((block, stack[ids[p]][-1]))
 
-        # Recursive calls.
-        for b in sorted(domtree[block]):
-            _rename(b)
-
-        # Restore stacks.
-        stack.update(old_stack)
+        return pushed
 
     entry = list(blocks.keys())[0]
-    _rename(entry)
+
+    # Blocks that are unreachable from the entry are not in the
+    # dominator tree. Rename them as if the entry dominated them.
+    in_tree = {entry}.union(*domtree.values())
+    unreachable = [b for b in blocks if b not in in_tree]
+    if unreachable:
+        domtree = dict(domtree)
+        domtree[entry] = domtree[entry].union(unreachable)
+
+    # Walk the dominator tree (without recursion, because it can be very
+    # deep), undoing each block's pushes on the way out of it.
+    logs = []
+    for block, entering in walk_tree(domtree, entry):
+        if entering:
+            logs.append(_rename(block))
+        else:
+            for i in logs.pop():
+                stack[i].pop()
 
     return phi_args, phi_dests
 
 
+def phi_chains(phi_args, phi_dests):
+    """Get the use-def chains between phi-nodes.
+
+    Each phi-node is named by its block and the original variable, like
+    the keys of `phi_args` and `phi_dests`. Produce a pair of maps: from
+    each phi destination to the phi-node that defines it, and from each
+    phi destination to the list of phi-nodes that take it as an
+    argument (once per use).
+    """
+    defs = {}
+    for block, dests in phi_dests.items():
+        for v, dest in dests.items():
+            defs[dest] = block, v
+    users = {dest: [] for dest in defs}
+    for block, args in phi_args.items():
+        for v, v_args in args.items():
+            for _, a in v_args:
+                if a in users:
+                    users[a].append((block, v))
+    return defs, users
+
+
 def prune_phis(pred, phi_args, phi_dests):
     """Prune possibly-undefined phi-nodes.
 
@@ -96,26 +162,32 @@ def prune_phis(pred, phi_args, phi_dests):
     variable is defined along some but not all paths. These phi-nodes
     are useless because it is illegal to read from the result. And they
     can confuse the out-of-SSA pass because it creates nonsensical
-    copies. This algorithm iteratively eliminates such phi-nodes,
-    propagating through to eliminate consumer phi-nodes until
-    convergence.
+    copies. This algorithm eliminates such phi-nodes, propagating along
+    the phi use-def chains to eliminate consumer phi-nodes, so each use
+    of a pruned phi-node is looked at once.
     """
-    # We build up a set of new names (phi destinations) to prune, and we
-    # iterate until this set stops growing.
-    old_prune_len = -1
-    prune = set()
-    while len(prune) != old_prune_len:
-        old_prune_len = len(prune)
-
-        # Look at each phi.
-        for block, args in phi_args.items():
-            dests = phi_dests[block]
-            for v, v_args in args.items():
-                # How many non-pruned arguments does this phi have?
-                live_args = [a for _, a in v_args if a not in prune]
-                if len(live_args) < len(pred[block]):
-                    # Prune phis with insufficient arguments.
-                    prune.add(dests[v])
+    _, users = phi_chains(phi_args, phi_dests)
+
+    # Count the arguments of each phi-node that are not pruned. Start
+    # with the phi-nodes that are already missing an argument.
+    live = {}
+    work = []
+    for block, args in phi_args.items():
+        for v, v_args in args.items():
+            live[block, v] = len(v_args)
+            if len(v_args) < len(pred[block]):
+                work.append(phi_dests[block][v])
+    prune = set(work)
+
+    # Prune the users of pruned phi-nodes once they have too few
+    # arguments left.
+    while work:
+        for block, v in users[work.pop()]:
+            live[block, v] -= 1
+            dest = phi_dests[block][v]
+            if live[block, v] < len(pred[block]) and dest not in prune:
+                prune.add(dest)
+                work.append(dest)
 
     # Actually delete all phis with pruned destinations.
     for block, args in phi_args.items():
@@ -129,13 +201,13 @@ def prune_phis(pred, phi_args, phi_dests):
 def insert_phis(blocks, phi_args, phi_dests, types):
     for block, instrs in blocks.items():
         for dest, pairs in sorted(phi_args[block].items()):
-            phi = {
-                'op': 'phi',
-                'dest': phi_dests[block][dest],
-                'type': types[dest],
-                'labels': [p[0] for p in pairs],
-                'args': [p[1] for p in pairs],
-            }
+            phi = Instr(
+                'phi',
+                dest=phi_dests[block][dest],
+                type=types[dest],
+                labels=[p[0] for p in pairs],
+                args=[p[1] for p in pairs],
+            )
             instrs.insert(0, phi)
 
 
@@ -143,40 +215,74 @@ def get_types(func):
     # Silly way to get the type of variables. (According to the Bril
     # spec, well-formed programs must use only a single type for every
     # variable within a given function.)
-    types = {arg['name']: arg['type'] for arg in func.get('args', [])}
-    for instr in func['instrs']:
-        if 'dest' in instr:
-            types[instr['dest']] = instr['type']
+    types = {arg.name: arg.type for arg in func.args or ()}
+    for instr in func.instrs:
+        if isinstance(instr, Instr) and instr.dest is not None:
+            types[instr.dest] = instr.type
     return types
 
 
-def func_to_ssa(func):
-    blocks = block_map(form_blocks(func['instrs']))
-    add_entry(blocks)
-    add_terminators(blocks)
-    succ = {name: successors(block[-1]) for name, block in blocks.items()}
-    pred = map_inv(succ)
-    dom = get_dom(succ, list(blocks.keys())[0])
+# The kinds of SSA form. Minimal SSA has a phi-node for a variable in
+# the iterated dominance frontier of its assignments. Semi-pruned SSA
+# only has them for the variables in `global_names`, and pruned SSA
+# only has them where the variable is live.
+MODES = ('minimal', 'semi', 'pruned')
+
 
-    df = dom_fronts(dom, succ)
+def func_to_ssa(func, am=None, mode='minimal', stats=None):
+    """Convert a function to SSA form, of one of the kinds in `MODES`.
+    The analyses come from the `AnalysisManager` `am`, if given. The
+    blocks of its `cfg` are modified in place, so this preserves every
+    analysis that does not look at the instructions. Given a `stats`
+    Counter, count the phi-nodes that are placed (`placed`) and the ones
+    that are left after pruning the partially undefined ones (`phis`).
+    """
+    if am is None:
+        am = AnalysisManager()
+    blocks = am.get(func, 'cfg')
+    succ = am.get(func, 'succ')
+    pred = am.get(func, 'pred')
+
+    df = am.get(func, 'frontiers')
     defs = def_blocks(blocks)
     types = get_types(func)
-    arg_names = {a['name'] for a in func['args']} if 'args' in func else set()
-
-    phis = get_phis(blocks, df, defs)
-    phi_args, phi_dests = ssa_rename(blocks, phis, succ, dom_tree(dom),
-                                     arg_names)
+    arg_names = set(func.arg_names())
+
+    live_in = None
+    if mode == 'semi':
+        names = global_names(blocks)
+        defs = {v: d for v, d in defs.items() if v in names}
+    elif mode == 'pruned':
+        live_in, _ = am.get(func, 'live')
+
+    phis = get_phis(blocks, df, defs, live_in)
+    phi_args, phi_dests = ssa_rename(blocks, phis, succ,
+                                     am.get(func, 'dom_tree'),
+                                     arg_names, func.symbols)
     prune_phis(pred, phi_args, phi_dests)
     insert_phis(blocks, phi_args, phi_dests, types)
+    if stats is not None:
+        stats['placed'] += sum(len(ps) for ps in phis.values())
+        stats['phis'] += sum(len(ps) for ps in phi_dests.values())
 
-    func['instrs'] = reassemble(blocks)
+    func.instrs = reassemble(blocks)
 
 
-def to_ssa(bril):
-    for func in bril['functions']:
-        func_to_ssa(func)
+def to_ssa(bril, idom='chk', mode='minimal'):
+    for func in bril.functions:
+        func_to_ssa(func, AnalysisManager(idom), mode)
     return bril
 
 
 if __name__ == '__main__':
-    print(json.dumps(to_ssa(json.load(sys.stdin)), indent=2, sort_keys=True))
+    # Pass `--idom lt` to compute dominators with Lengauer and Tarjan's
+    # algorithm instead. Pass `-p` for pruned SSA or `-s` for
+    # semi-pruned SSA.
+    args = sys.argv[1:]
+    try:
+        idom = idom_arg(args)
+    except ValueError as e:
+        sys.exit('error: {}'.format(e))
+    mode = 'pruned' if '-p' in args else 'semi' if '-s' in args else \
+        'minimal'
+    ir.dump(to_ssa(ir.load(), idom, mode))
@@ -1,4 +1,6 @@
 import itertools
+import json
+import sys
 
 
 def flatten(ll):
@@ -7,12 +9,46 @@ def flatten(ll):
     return list(itertools.chain(*ll))
 
 
-def fresh(seed, names):
+def fresh(seed, names, counters=None):
     """Generate a new name that is not in `names` starting with `seed`.
+
+    To generate many names, pass the same `counters` dict every time. It
+    remembers where to resume counting for each seed, so (as long as the
+    new names are added to `names`) each call takes constant time
+    instead of probing `seed1`, `seed2`, ... from the start.
     """
-    i = 1
+    i = 1 if counters is None else counters.get(seed, 1)
     while True:
         name = seed + str(i)
         if name not in names:
+            if counters is not None:
+                counters[seed] = i + 1
             return name
         i += 1
+
+
+def iter_bits(bits):
+    """Generate the indices of the set bits in an int, in increasing
+    order.
+    """
+    # Scanning the binary string is much faster than bit twiddling on
+    # big ints.
+    digits = bin(bits)[:1:-1]
+    i = digits.find('1')
+    while i != -1:
+        yield i
+        i = digits.find('1', i + 1)
+
+
+def load(f=None):
+    """Load a Bril program from a text stream (standard input by
+    default). The program may be JSON or in the binary format from
+    `bril-bin`; binary input requires the `brilbin` module.
+    """
+    f = f or sys.stdin
+    buf = getattr(f, 'buffer', None)
+    if buf is not None and hasattr(buf, 'peek') and \
+            buf.peek(4)[:4] == b'BRLB':
+        import brilbin
+        return brilbin.load(buf)
+    return json.load(f)
@@ -0,0 +1,53 @@
+"""Compare the size and load time of the JSON and binary (`bril2bin`)
+representations of a large program:
+
+    $ python bin.py --funcs 10 --instrs 200000
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bril-bin'))
+
+import brilbin  # noqa: E402
+import gen  # noqa: E402
+
+
+def best_time(func, reps=3):
+    best = float('inf')
+    for _ in range(reps):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(funcs, instrs):
+    prog = gen.gen_prog(funcs, instrs)
+    js = json.dumps(prog, indent=2, sort_keys=True)
+    js_compact = json.dumps(prog, separators=(',', ':'))
+    bin = brilbin.encode(prog)
+    assert brilbin.BinaryProgram(bin).to_json() == prog
+
+    def first_func():
+        brilbin.BinaryProgram(bin).function(0)
+
+    print('{} functions, {} instructions'.format(
+        funcs, gen.count_instrs(prog),
+    ))
+    print('{:>20}: {:10} bytes'.format('JSON', len(js)))
+    print('{:>20}: {:10} bytes'.format('JSON (compact)', len(js_compact)))
+    print('{:>20}: {:10} bytes'.format('binary', len(bin)))
+    for name, func in [
+        ('json.loads', lambda: json.loads(js)),
+        ('brilbin decode', lambda: brilbin.BinaryProgram(bin).to_json()),
+        ('brilbin first func', first_func),
+    ]:
+        print('{:>20}: {:10.4f} s'.format(name, best_time(func)))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--funcs', 10), gen._opt(args, '--instrs', 200000))
@@ -0,0 +1,108 @@
+"""Count the copies that `examples/from_ssa.py` leaves in the programs in
+`benchmarks/`, and how many instructions they run, after each of these
+pipelines:
+
+    $ python copies.py
+
+"naive" is the old way out of SSA form, with one copy per phi-node
+argument at the end of the predecessor, even on critical edges.
+"split" splits critical edges and orders each parallel copy, and
+"coalesced" also coalesces the phi-related names that do not interfere.
+Each one goes after `to_ssa` alone and after `to_ssa,lvn(pcf),tdce+`.
+The dynamic counts come from `brili -p`, which must be on your PATH, and
+the outputs are checked against the original programs'. (The naive way
+can get them wrong after `lvn`.)
+"""
+
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bril-txt'))
+
+from analyses import AnalysisManager  # noqa: E402
+from cfg import reassemble  # noqa: E402
+from ir import Instr  # noqa: E402
+import briltxt  # noqa: E402
+import from_ssa  # noqa: E402
+import ir  # noqa: E402
+import opt  # noqa: E402
+
+BENCHMARKS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks')
+BEFORE = ['to_ssa', 'to_ssa,lvn(pcf),tdce+']
+
+
+def naive_from_ssa(func):
+    """`from_ssa.func_from_ssa` as it was.
+    """
+    blocks = AnalysisManager().get(func, 'cfg')
+    for block in blocks.values():
+        for instr in block:
+            if instr.op == 'phi':
+                for label, arg in zip(instr.labels, instr.args):
+                    blocks[label].insert(-1, Instr(
+                        'id', type=instr.type, args=[arg], dest=instr.dest,
+                    ))
+        block[:] = [i for i in block if i.op != 'phi']
+    func.instrs = reassemble(blocks)
+
+
+OUT_OF_SSA = {
+    'naive': naive_from_ssa,
+    'split': lambda func: from_ssa.func_from_ssa(
+        func, coalesce_copies=False,
+    ),
+    'coalesced': from_ssa.func_from_ssa,
+}
+
+
+def run(prog, args):
+    """Run a program (as JSON) with `brili -p`. Return its output and the
+    number of instructions it ran.
+    """
+    proc = subprocess.run(
+        ['brili', '-p'] + args, input=json.dumps(prog),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    match = re.search(r'total_dyn_inst: (\d+)', proc.stderr)
+    return proc.stdout, int(match.group(1)) if match else 0
+
+
+def bench():
+    progs = []
+    for path in sorted(glob.glob(os.path.join(BENCHMARKS, '*.bril'))):
+        with open(path) as f:
+            txt = f.read()
+        match = re.search(r'ARGS:(.*)', txt)
+        args = match.group(1).split() if match else []
+        progs.append((json.loads(briltxt.parse_bril(txt)), args))
+    expected = [run(prog, args) for prog, args in progs]
+    print('{} programs in benchmarks/, {} instructions run'.format(
+        len(progs), sum(n for _, n in expected),
+    ))
+
+    for before in BEFORE:
+        print(before)
+        pipeline = opt.parse_pipeline(before)
+        for name, func_from_ssa in OUT_OF_SSA.items():
+            copies = dynamic = wrong = 0
+            for (data, args), (out, _) in zip(progs, expected):
+                prog = opt.run_pipeline(ir.from_json(data), pipeline)
+                for func in prog.functions:
+                    func_from_ssa(func)
+                    copies += sum(isinstance(i, Instr) and i.op == 'id'
+                                  for i in func.instrs)
+                new_out, n = run(prog.to_json(), args)
+                dynamic += n
+                wrong += new_out != out
+            print('  {:>9}: {:5} copies, {:8} instructions run, '
+                  '{} wrong'.format(name, copies, dynamic, wrong))
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,197 @@
+"""Measure the data flow analyses in `examples/df.py` on a big function,
+with Python sets (the way `defined` and `live` used to work) and with the
+bit-vector engine, `df.df_bits`:
+
+    $ python dataflow.py --instrs 5000
+
+The "(to sets)" lines include converting the bit-vector results back to
+sets of names, which is what `df.df_sets` and the `df.py` tool do.
+
+Then it compares the order in which the solver visits blocks, on the
+same function and on a deep loop nest (`--depth`): a plain FIFO queue
+that starts with every block in order and may hold a block many times
+(the way `df.df_worklist` used to work) versus `df.Worklist`, which
+visits blocks in reverse postorder (postorder for backward problems) and
+holds each block at most once. It reports how many times each one
+evaluates a transfer function.
+"""
+
+import os
+import sys
+import time
+from collections import Counter, deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import cfg  # noqa: E402
+import df  # noqa: E402
+import gen  # noqa: E402
+import ir  # noqa: E402
+from form_blocks import form_blocks  # noqa: E402
+
+
+def union(sets):
+    out = set()
+    for s in sets:
+        out.update(s)
+    return out
+
+
+def block_defs(block):
+    """Variables that are written in the block.
+    """
+    return {i.dest for i in block if i.dest is not None}
+
+
+def block_uses(block):
+    """Variables that are read before they are written in the block.
+    """
+    defined = set()  # Locally defined.
+    used = set()
+    for i in block:
+        if i.args:
+            used.update(v for v in i.args if v not in defined)
+        if i.dest is not None:
+            defined.add(i.dest)
+    return used
+
+
+SET_ANALYSES = {
+    'defined': df.Analysis(
+        True,
+        init=set(),
+        merge=union,
+        transfer=lambda block, in_: in_.union(block_defs(block)),
+    ),
+    'live': df.Analysis(
+        False,
+        init=set(),
+        merge=union,
+        transfer=lambda block, out: block_uses(block).union(
+            out - block_defs(block)
+        ),
+    ),
+}
+
+
+def fifo_bits(blocks, analysis, stats):
+    """`df.df_bits` with the old FIFO worklist.
+    """
+    graph = cfg.CFG.from_blocks(blocks)
+    universe, gen, kill = analysis.gen_kill(list(blocks.values()))
+    if analysis.forward:
+        in_edges, out_edges = graph.predecessors, graph.successors
+    else:
+        in_edges, out_edges = graph.successors, graph.predecessors
+    in_ = [0] * len(graph)
+    out = [0] * len(graph)
+    worklist = deque(range(len(graph)))
+    while worklist:
+        node = worklist.popleft()
+        stats['visits'] += 1
+        inval = 0
+        for n in in_edges(node):
+            inval |= out[n]
+        in_[node] = inval
+        outval = gen[node] | (inval & ~kill[node])
+        if outval != out[node]:
+            out[node] = outval
+            worklist.extend(out_edges(node))
+    return in_, out
+
+
+def loop_nest(depth):
+    """A function with `depth` nested loops, each of which defines a
+    variable that is used in the innermost loop.
+    """
+    instrs = [{'op': 'const', 'dest': 'one', 'type': 'int', 'value': 1}]
+    for d in range(depth):
+        instrs += [
+            {'op': 'const', 'dest': 'i{}'.format(d), 'type': 'int',
+             'value': 0},
+            {'label': 'head{}'.format(d)},
+            {'op': 'lt', 'dest': 'c{}'.format(d), 'type': 'bool',
+             'args': ['i{}'.format(d), 'one']},
+            {'op': 'br', 'args': ['c{}'.format(d)],
+             'labels': ['body{}'.format(d), 'done{}'.format(d)]},
+            {'label': 'body{}'.format(d)},
+        ]
+    for d in range(depth):
+        instrs.append({'op': 'add', 'dest': 'x', 'type': 'int',
+                       'args': ['i{}'.format(d), 'one']})
+    for d in reversed(range(depth)):
+        instrs += [
+            {'op': 'add', 'dest': 'i{}'.format(d), 'type': 'int',
+             'args': ['i{}'.format(d), 'one']},
+            {'op': 'jmp', 'labels': ['head{}'.format(d)]},
+            {'label': 'done{}'.format(d)},
+        ]
+    instrs.append({'op': 'print', 'args': ['one']})
+    return ir.from_json({'functions': [{'name': 'main', 'instrs': instrs}]})
+
+
+def compare_orders(blocks, reps):
+    for name in 'defined', 'live', 'reaching':
+        analysis = df.ANALYSES[name]
+        fifo, prio = Counter(), Counter()
+        _, in_, out = df.df_bits(blocks, analysis, prio)
+        expected = list(in_.values()), list(out.values())
+        if not analysis.forward:
+            expected = expected[::-1]
+        assert fifo_bits(blocks, analysis, fifo) == expected
+        fifo_time = measure(lambda: fifo_bits(blocks, analysis, Counter()),
+                            reps)
+        prio_time = measure(lambda: df.df_bits(blocks, analysis), reps)
+        print('{:>8}: {:7} visits, {:8.2f} ms FIFO; '
+              '{:7} visits, {:8.2f} ms priority'.format(
+                  name, fifo['visits'], fifo_time * 1e3,
+                  prio['visits'], prio_time * 1e3,
+              ))
+
+
+def measure(func, reps):
+    best = float('inf')
+    for _ in range(reps):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(instrs, depth, reps):
+    func = ir.from_json(gen.gen_prog(instrs=instrs)).functions[0]
+    blocks = cfg.block_map(form_blocks(func.instrs))
+    cfg.add_terminators(blocks)
+    print('{} blocks, {} variables'.format(
+        len(blocks), len({i.dest for i in func.instrs if i.dest}),
+    ))
+
+    for name, analysis in SET_ANALYSES.items():
+        bits = df.ANALYSES[name]
+        assert df.df_worklist(blocks, analysis) == df.df_sets(blocks, bits)
+        for label, f in [
+            ('sets', lambda: df.df_worklist(blocks, analysis)),
+            ('bits', lambda: df.df_bits(blocks, bits)),
+            ('(to sets)', lambda: df.df_sets(blocks, bits)),
+        ]:
+            print('{:>8} {:>9}: {:8.2f} ms'.format(
+                name, label, measure(f, reps) * 1e3,
+            ))
+    reaching = df.ANALYSES['reaching']
+    print('{:>8} {:>9}: {:8.2f} ms'.format(
+        'reaching', 'bits', measure(lambda: df.df_bits(blocks, reaching),
+                                    reps) * 1e3,
+    ))
+    compare_orders(blocks, reps)
+
+    func = loop_nest(depth).functions[0]
+    blocks = cfg.block_map(form_blocks(func.instrs))
+    cfg.add_terminators(blocks)
+    print('loop nest of depth {}, {} blocks'.format(depth, len(blocks)))
+    compare_orders(blocks, reps)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--instrs', 5000), gen._opt(args, '--depth', 100),
+          gen._opt(args, '--reps', 3))
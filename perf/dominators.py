@@ -0,0 +1,208 @@
+"""Measure how computing dominators scales on big synthetic control-flow
+graphs, from 1,000 to 100,000 blocks:
+
+    $ python dominators.py
+
+For each size it times building the `cfg.CFG`, the immediate dominators
+with both algorithms in `dom.IDOM` (Cooper, Harvey, and Kennedy's
+iterative algorithm, `chk`, and Lengauer and Tarjan's, `lt`), and the
+dominator tree and the dominance frontiers from them with
+`dom.idom_tree` and `dom.graph_fronts`, numbering the tree with
+`dom.DomTree`, walking it with `dom.walk_tree`, and answering 10,000
+dominance queries with the numbering and by walking up the tree, and
+finding the loop forest with `loops.find_loops`. (The tree is very
+deep, so none of this can use recursion.) For graphs with up to
+`--max-sets` blocks it also times the full dominator sets as bit sets
+(`dom.graph_dom`) and the old ways of getting the tree and the
+frontiers, from sets of names with `dom.dom_tree` and `dom.dom_fronts`;
+these take quadratic time and memory.
+
+The graphs are a long chain of blocks with short random loops and
+forward jumps, so the dominator tree is deep.
+
+Then it compares the two idom algorithms on every function in
+`benchmarks/*.bril` and on irreducible graphs that are bad cases for
+the iterative algorithm. It checks that both algorithms always agree.
+"""
+
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bril-txt'))
+
+import analyses  # noqa: E402
+import briltxt  # noqa: E402
+import cfg  # noqa: E402
+import dom  # noqa: E402
+import gen  # noqa: E402
+import ir  # noqa: E402
+import loops  # noqa: E402
+
+BENCHMARKS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks')
+
+
+def random_cfg(n, seed=0):
+    """Make a successor map for a graph with `n` blocks.
+    """
+    rng = random.Random(seed)
+    succ = {}
+    for i in range(n):
+        out = [i + 1] if i + 1 < n else []
+        r = rng.random()
+        if r < 0.2 and i > 0:
+            out.append(rng.randrange(max(1, i - 50), i + 1))  # A loop.
+        elif r < 0.4 and i + 2 < n:
+            out.append(rng.randrange(i + 2, min(n, i + 50)))  # A skip.
+        succ['b{}'.format(i)] = ['b{}'.format(j) for j in out]
+    return succ
+
+
+def ladder(n):
+    """An irreducible graph: the entry jumps to every block in a chain
+    whose blocks also jump back to their predecessors.
+    """
+    succ = {'entry': ['b{}'.format(i) for i in range(n)]}
+    for i in range(n):
+        succ['b{}'.format(i)] = ['b{}'.format(j) for j in (i + 1, i - 1)
+                                 if 0 <= j < n]
+    return succ
+
+
+def two_way_chain(n):
+    """An irreducible graph: a chain whose blocks also jump back to
+    their predecessors, entered at both ends. Every pass of the
+    iterative algorithm only moves information one block along, so it
+    takes quadratic time.
+    """
+    succ = {'entry': ['b0', 'b{}'.format(n - 1)]}
+    for i in range(n):
+        succ['b{}'.format(i)] = ['b{}'.format(j) for j in (i + 1, i - 1)
+                                 if 0 <= j < n]
+    return succ
+
+
+def compare(graph, reps):
+    """Time both idom algorithms on a graph and check that they agree.
+    """
+    results = [dom.graph_idom(graph, alg) for alg in sorted(dom.IDOM)]
+    assert all(r == results[0] for r in results)
+    return [measure(lambda: dom.graph_idom(graph, alg), reps)
+            for alg in sorted(dom.IDOM)]
+
+
+def bench_bril(reps):
+    graphs = []
+    for path in sorted(glob.glob(os.path.join(BENCHMARKS, '*.bril'))):
+        with open(path) as f:
+            prog = ir.from_json(json.loads(briltxt.parse_bril(f.read())))
+        am = analyses.AnalysisManager()
+        graphs += [am.get(func, 'graph') for func in prog.functions]
+    totals = [0.0] * len(dom.IDOM)
+    for graph in graphs:
+        for i, t in enumerate(compare(graph, reps)):
+            totals[i] += t
+    print('{} functions in benchmarks/: {}'.format(len(graphs), ', '.join(
+        '{} {:.2f} ms'.format(alg, t * 1e3)
+        for alg, t in zip(sorted(dom.IDOM), totals)
+    )))
+
+
+def bench_bad(reps):
+    for name, make, sizes in [
+        ('ladder', ladder, (1000, 10000)),
+        ('two-way chain', two_way_chain, (300, 1000, 3000)),
+    ]:
+        for n in sizes:
+            times = compare(cfg.CFG(make(n)), reps)
+            print('{:>13} {:>6}: {}'.format(name, n, ', '.join(
+                '{} {:.1f} ms'.format(alg, t * 1e3)
+                for alg, t in zip(sorted(dom.IDOM), times)
+            )))
+
+
+def walk(graph, idom):
+    """Walk the whole dominator tree.
+    """
+    tree = dom.idom_tree(graph, idom)
+    for _ in dom.walk_tree(tree, graph.names[graph.entry]):
+        pass
+
+
+def walk_up(idom, a, b):
+    """Check dominance by walking up the tree from `b`.
+    """
+    while b != a:
+        if idom[b] in (-1, b):
+            return False
+        b = idom[b]
+    return True
+
+
+def measure(func, reps):
+    best = float('inf')
+    for _ in range(reps):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(max_sets, reps):
+    for n in (1000, 10000, 30000, 100000):
+        succ = random_cfg(n)
+        graph = cfg.CFG(succ)
+        idom = dom.graph_idom(graph)
+
+        chk, lt = compare(graph, reps)
+        times = [
+            ('CFG', measure(lambda: cfg.CFG(succ), reps)),
+            ('chk', chk),
+            ('lt', lt),
+            ('tree', measure(lambda: dom.idom_tree(graph, idom), reps)),
+            ('fronts', measure(lambda: dom.graph_fronts(graph, idom), reps)),
+            ('numbering', measure(lambda: dom.DomTree(graph, idom), reps)),
+            ('walk', measure(lambda: walk(graph, idom), reps)),
+        ]
+        rng = random.Random(n)
+        queries = [(rng.randrange(n), rng.randrange(n)) for _ in range(10000)]
+        tree = dom.DomTree(graph, idom)
+        times += [
+            ('10k queries', measure(
+                lambda: [tree.dominates(a, b) for a, b in queries], reps,
+            )),
+            ('(by walking)', measure(
+                lambda: [walk_up(idom, a, b) for a, b in queries], reps,
+            )),
+            ('loops', measure(lambda: loops.find_loops(graph, tree), reps)),
+        ]
+        if n <= max_sets:
+            dom_sets = dom.dom_map(graph)
+            assert dom.dom_tree(dom_sets) == dom.idom_tree(graph, idom)
+            fronts = dom.fronts_map(graph, dom.graph_fronts(graph, idom))
+            assert {b: set(f) for b, f in fronts.items()} == \
+                {b: set(f) for b, f in dom.dom_fronts(dom_sets, succ).items()}
+            times += [
+                ('dom bits', measure(lambda: dom.graph_dom(graph), reps)),
+                ('tree from sets', measure(
+                    lambda: dom.dom_tree(dom.dom_map(graph)), 1,
+                )),
+                ('fronts from sets', measure(
+                    lambda: dom.dom_fronts(dom.dom_map(graph), succ), 1,
+                )),
+            ]
+        print('{:>6} blocks: {}'.format(n, ', '.join(
+            '{} {:.1f} ms'.format(name, t * 1e3) for name, t in times
+        )))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    reps = gen._opt(args, '--reps', 3)
+    bench(gen._opt(args, '--max-sets', 10000), reps)
+    bench_bril(reps)
+    bench_bad(reps)
@@ -0,0 +1,132 @@
+"""Generate large synthetic Bril programs for performance measurement.
+
+The programs are well formed (every variable is defined before it is
+used along every path) but otherwise meaningless: each function is a
+chain of loops and diamonds full of arithmetic. Run this file to emit a
+program as JSON:
+
+    $ python gen.py --funcs 10 --instrs 100000 | bril2txt
+"""
+
+import json
+import random
+import sys
+
+ARITH_OPS = 'add', 'sub', 'mul'
+COMP_OPS = 'eq', 'lt', 'gt', 'le', 'ge'
+
+
+def gen_func(name, size, rng):
+    """Generate a function with roughly `size` instructions.
+    """
+    instrs = [
+        {'op': 'const', 'dest': 'zero', 'type': 'int', 'value': 0},
+        {'op': 'const', 'dest': 'one', 'type': 'int', 'value': 1},
+    ]
+    ints = ['zero', 'one', 'n']
+    label_count = 0
+
+    def fresh_label():
+        nonlocal label_count
+        label_count += 1
+        return 'l{}'.format(label_count)
+
+    def arith(count):
+        for _ in range(count):
+            dest = 'v{}'.format(len(instrs))
+            instrs.append({
+                'op': rng.choice(ARITH_OPS),
+                'dest': dest,
+                'type': 'int',
+                'args': [rng.choice(ints), rng.choice(ints)],
+            })
+            ints.append(dest)
+
+    while len(instrs) < size:
+        shape = rng.random()
+        if shape < 0.4:
+            # A counted loop.
+            head, body, done = fresh_label(), fresh_label(), fresh_label()
+            i = 'i{}'.format(len(instrs))
+            cond = 'c{}'.format(len(instrs))
+            instrs.append({'op': 'id', 'dest': i, 'type': 'int',
+                           'args': ['zero']})
+            instrs.append({'label': head})
+            instrs.append({'op': 'lt', 'dest': cond, 'type': 'bool',
+                           'args': [i, 'n']})
+            instrs.append({'op': 'br', 'args': [cond],
+                           'labels': [body, done]})
+            instrs.append({'label': body})
+            scope = len(ints)
+            arith(rng.randint(2, 12))
+            del ints[scope:]  # The body might not run.
+            instrs.append({'op': 'add', 'dest': i, 'type': 'int',
+                           'args': [i, 'one']})
+            instrs.append({'op': 'jmp', 'labels': [head]})
+            instrs.append({'label': done})
+        elif shape < 0.7:
+            # An if/else diamond that assigns the same variable on both
+            # sides.
+            then, els, join = fresh_label(), fresh_label(), fresh_label()
+            cond = 'c{}'.format(len(instrs))
+            out = 'm{}'.format(len(instrs))
+            instrs.append({'op': rng.choice(COMP_OPS), 'dest': cond,
+                           'type': 'bool',
+                           'args': [rng.choice(ints), rng.choice(ints)]})
+            instrs.append({'op': 'br', 'args': [cond],
+                           'labels': [then, els]})
+            scope = len(ints)
+            for label in (then, els):
+                instrs.append({'label': label})
+                arith(rng.randint(1, 6))
+                instrs.append({'op': 'id', 'dest': out, 'type': 'int',
+                               'args': [ints[-1]]})
+                instrs.append({'op': 'jmp', 'labels': [join]})
+                del ints[scope:]  # Only defined on one side.
+            instrs.append({'label': join})
+            ints.append(out)
+        else:
+            # Straight-line code.
+            arith(rng.randint(4, 20))
+            instrs.append({'op': 'print', 'args': [ints[-1]]})
+
+    instrs.append({'op': 'ret', 'args': [ints[-1]]})
+    return {
+        'name': name,
+        'args': [{'name': 'n', 'type': 'int'}],
+        'type': 'int',
+        'instrs': instrs,
+    }
+
+
+def gen_prog(funcs=1, instrs=10000, seed=0):
+    """Generate a program with `funcs` functions containing about
+    `instrs` instructions in total.
+    """
+    rng = random.Random(seed)
+    size = max(instrs // funcs, 1)
+    return {
+        'functions': [gen_func('f{}'.format(i), size, rng)
+                      for i in range(funcs)],
+    }
+
+
+def count_instrs(prog):
+    """Count the instructions (not labels) in a program.
+    """
+    return sum(sum(1 for i in func['instrs'] if 'op' in i)
+               for func in prog['functions'])
+
+
+def _opt(args, name, default):
+    if name in args:
+        return int(args[args.index(name) + 1])
+    return default
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    prog = gen_prog(_opt(args, '--funcs', 1),
+                    _opt(args, '--instrs', 10000),
+                    _opt(args, '--seed', 0))
+    json.dump(prog, sys.stdout, indent=2, sort_keys=True)
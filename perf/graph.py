@@ -0,0 +1,120 @@
+"""Measure building the control-flow graph and computing dominators for
+a big function, with dicts of sets keyed by block name (the way
+`dom.get_dom` used to work) and with the index-based `cfg.CFG`:
+
+    $ python graph.py --instrs 5000
+
+It runs everything twice: with short labels and with long ones. The
+"(as bit sets)" line is the time for the dominators as bit sets, without
+converting them to sets of names. The last two lines split every edge
+into a block with more than one predecessor in a `cfg.FlowGraph`, which
+keeps its edges up to date, and the same with `cfg.edges` rebuilding
+the edges after every split.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import cfg  # noqa: E402
+import dom  # noqa: E402
+import gen  # noqa: E402
+import ir  # noqa: E402
+from form_blocks import form_blocks  # noqa: E402
+
+
+def lengthen_labels(prog, prefix):
+    for func in prog['functions']:
+        for instr in func['instrs']:
+            if 'label' in instr:
+                instr['label'] = prefix + instr['label']
+            if 'labels' in instr:
+                instr['labels'] = [prefix + lb for lb in instr['labels']]
+
+
+def edges_by_name(blocks):
+    preds = {name: [] for name in blocks}
+    succs = {name: [] for name in blocks}
+    for name, block in blocks.items():
+        for succ in cfg.successors(block[-1]):
+            succs[name].append(succ)
+            preds[succ].append(name)
+    return preds, succs
+
+
+def dom_by_name(blocks):
+    """The old set-based algorithm.
+    """
+    pred, succ = edges_by_name(blocks)
+    entry = next(iter(blocks))
+    nodes = list(reversed(dom.postorder(succ, entry)))
+    dom_sets = {v: set(nodes) for v in succ}
+    changed = True
+    while changed:
+        changed = False
+        for node in nodes:
+            ps = [dom_sets[p] for p in pred[node]]
+            new_dom = set.intersection(*ps) if ps else set()
+            new_dom.add(node)
+            if dom_sets[node] != new_dom:
+                dom_sets[node] = new_dom
+                changed = True
+    return dom_sets
+
+
+def dom_by_index(blocks):
+    return dom.dom_map(cfg.CFG.from_blocks(blocks))
+
+
+def split_joins(blocks, rebuild):
+    graph = cfg.FlowGraph((name, ir.Block(name, block))
+                          for name, block in blocks.items())
+    for a in list(graph):
+        for b in list(graph.succ[a]):
+            if len(graph.pred[b]) > 1:
+                graph.split_edge(a, b)
+                if rebuild:
+                    cfg.edges(graph)
+    return graph
+
+
+def measure(func, reps):
+    best = float('inf')
+    for _ in range(reps):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(instrs, reps):
+    for prefix in ('', 'a_rather_long_label_prefix_' * 3):
+        prog = gen.gen_prog(instrs=instrs)
+        lengthen_labels(prog, prefix)
+        func = ir.from_json(prog).functions[0]
+        blocks = cfg.block_map(form_blocks(func.instrs))
+        cfg.add_entry(blocks)
+        cfg.add_terminators(blocks)
+        assert dom_by_name(blocks) == dom_by_index(blocks)
+        graph = cfg.CFG.from_blocks(blocks)
+
+        print('{} blocks, labels like {}'.format(
+            len(blocks), list(blocks)[-1],
+        ))
+        for name, f in [
+            ('edges by name', lambda: edges_by_name(blocks)),
+            ('CFG', lambda: cfg.CFG.from_blocks(blocks)),
+            ('dom by name', lambda: dom_by_name(blocks)),
+            ('dom on CFG', lambda: dom_by_index(blocks)),
+            ('(as bit sets)', lambda: dom.graph_dom(graph)),
+            ('split edges', lambda: split_joins(blocks, False)),
+            ('split, rebuild', lambda: split_joins(blocks, True)),
+        ]:
+            print('{:>16}: {:8.2f} ms'.format(name, measure(f, reps) * 1e3))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--instrs', 5000), gen._opt(args, '--reps', 3))
@@ -0,0 +1,95 @@
+"""Compare the JSON (dict-based) representation of a Bril function with
+the slotted in-memory IR in `examples/ir.py`: the memory each one uses
+and the time it takes the example passes' typical traversal (visit every
+instruction and look at its destination and arguments):
+
+    $ python memory.py --instrs 100000
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+
+import df  # noqa: E402
+import gen  # noqa: E402
+import ir  # noqa: E402
+import tdce  # noqa: E402
+
+
+def size(make):
+    """Return the memory retained by the object that `make` builds.
+    """
+    gc.collect()
+    tracemalloc.start()
+    obj = make()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return current
+
+
+def measure(func, reps):
+    best = float('inf')
+    for _ in range(reps):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def traverse_json(func):
+    used = set()
+    defined = set()
+    for instr in func['instrs']:
+        used.update(instr.get('args', []))
+        if 'dest' in instr:
+            defined.add(instr['dest'])
+    return used, defined
+
+
+def traverse_ir(func):
+    used = set()
+    defined = set()
+    for instr in func.instrs:
+        if instr.args:
+            used.update(instr.args)
+        if instr.dest is not None:
+            defined.add(instr.dest)
+    return used, defined
+
+
+def bench(instrs, reps):
+    js = json.dumps(gen.gen_prog(instrs=instrs))
+    json_size = size(lambda: json.loads(js))
+    ir_size = size(lambda: ir.from_json(json.loads(js)))
+    count = gen.count_instrs(json.loads(js))
+    print('{} instructions'.format(count))
+    print('  memory: JSON {:.1f} MB, IR {:.1f} MB ({:.1f}x smaller)'.format(
+        json_size / 1e6, ir_size / 1e6, json_size / ir_size,
+    ))
+
+    json_func = json.loads(js)['functions'][0]
+    ir_func = ir.from_json(json.loads(js)).functions[0]
+    assert traverse_json(json_func) == traverse_ir(ir_func)
+    json_time = measure(lambda: traverse_json(json_func), reps)
+    ir_time = measure(lambda: traverse_ir(ir_func), reps)
+    print('  traversal: JSON {:.1f} ms, IR {:.1f} ms ({:.1f}x faster)'.format(
+        json_time * 1e3, ir_time * 1e3, json_time / ir_time,
+    ))
+
+    # A whole pass, on the IR, for reference.
+    elapsed = measure(lambda: tdce.trivial_dce_pass(ir_func), reps)
+    print('  tdce pass on the IR: {:.1f} ms'.format(elapsed * 1e3))
+    elapsed = measure(lambda: df.ANALYSES['live'].gen_kill([ir_func.instrs]),
+                      reps)
+    print('  live gen/kill on the IR: {:.1f} ms'.format(elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--instrs', 100000), gen._opt(args, '--reps', 5))
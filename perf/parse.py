@@ -0,0 +1,69 @@
+"""Measure the throughput of the text format parser (`bril2json`).
+
+Compares the original approach---build an Earley parser for every call,
+then transform the tree---against the cached LALR parser that
+`briltxt.parse_bril` now uses. Reports instructions parsed per second:
+
+    $ python parse.py --instrs 20000
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bril-txt'))
+
+import lark  # noqa: E402
+import briltxt  # noqa: E402
+import gen  # noqa: E402
+
+
+class TreeTransformer(briltxt.JSONTransformer, lark.Transformer):
+    pass
+
+
+def parse_earley(txt):
+    """The parser as `parse_bril` used to do it.
+    """
+    parser = lark.Lark(briltxt.GRAMMAR, maybe_placeholders=True)
+    return TreeTransformer().transform(parser.parse(txt))
+
+
+def parse_lalr(txt):
+    return briltxt.get_parser().parse(txt)
+
+
+def measure(func, txt, reps):
+    """Return the best time out of `reps` runs of `func(txt)`.
+    """
+    best = float('inf')
+    for _ in range(reps):
+        start = time.perf_counter()
+        func(txt)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(instrs, reps):
+    prog = gen.gen_prog(instrs=instrs)
+    count = gen.count_instrs(prog)
+    with contextlib.redirect_stdout(io.StringIO()) as f:
+        briltxt.print_prog(prog)
+    txt = f.getvalue()
+
+    # Check that the parsers agree before timing them.
+    assert parse_earley(txt) == parse_lalr(txt) == prog
+
+    print('{} instructions, {} bytes'.format(count, len(txt)))
+    for name, func in [('earley', parse_earley), ('lalr', parse_lalr)]:
+        elapsed = measure(func, txt, reps)
+        print('{:>8}: {:8.3f} s  {:10.0f} instrs/s'.format(
+            name, elapsed, count / elapsed,
+        ))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--instrs', 20000), gen._opt(args, '--reps', 3))
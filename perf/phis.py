@@ -0,0 +1,133 @@
+"""Count the phi-nodes that `examples/to_ssa.py` makes in each of its
+modes (`to_ssa.MODES`: minimal, semi-pruned, and pruned SSA), and time
+the conversion:
+
+    $ python phis.py --instrs 5000
+
+"Placed" counts the phi-nodes that go in before renaming, and "left"
+counts the ones that are left after `to_ssa.prune_phis` deletes the
+partially undefined ones. It reports the totals over every program in
+`benchmarks/` and over a big generated program. Then it times pruning a
+long chain of phi-nodes (`--chain`) with `to_ssa.prune_phis` and with
+the old pruning loop, which rescanned every phi-node until nothing
+changed.
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import gen
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bril-txt'))
+
+import briltxt  # noqa: E402
+import ir  # noqa: E402
+import to_ssa  # noqa: E402
+
+BENCHMARKS = os.path.join(os.path.dirname(__file__), '..', 'benchmarks')
+
+
+def convert(data, mode, reps):
+    """Convert a program (as JSON) to SSA form. Return the phi counts
+    and the best time.
+    """
+    best = float('inf')
+    for _ in range(reps):
+        stats = Counter()
+        prog = ir.from_json(data)
+        start = time.perf_counter()
+        for func in prog.functions:
+            to_ssa.func_to_ssa(func, mode=mode, stats=stats)
+        best = min(best, time.perf_counter() - start)
+    return stats, best
+
+
+def rescan_prune(pred, phi_args, phi_dests):
+    """`to_ssa.prune_phis` as it was, rescanning every phi-node until the
+    set of pruned ones stops growing.
+    """
+    old_prune_len = -1
+    prune = set()
+    while len(prune) != old_prune_len:
+        old_prune_len = len(prune)
+        for block, args in phi_args.items():
+            dests = phi_dests[block]
+            for v, v_args in args.items():
+                live_args = [a for _, a in v_args if a not in prune]
+                if len(live_args) < len(pred[block]):
+                    prune.add(dests[v])
+    for block, args in phi_args.items():
+        dests = phi_dests[block]
+        for v in {v for v, d in dests.items() if d in prune}:
+            del args[v]
+            del dests[v]
+
+
+def phi_chain(length):
+    """The phi-nodes for a chain of `length` blocks, as `to_ssa.ssa_rename`
+    would produce them, where each block's phi-node takes the one in the
+    next block as an argument. The last one is partially undefined, so
+    every phi-node in the chain gets pruned, one after another from the
+    back.
+    """
+    pred, phi_args, phi_dests = {}, {}, {}
+    for i in range(length):
+        block = 'b{}'.format(i)
+        pred[block] = ['p{}'.format(i), 'q{}'.format(i)]
+        phi_dests[block] = {'x': 'x.{}'.format(i)}
+        phi_args[block] = {'x': [('p{}'.format(i), 'x.{}'.format(i + 1))]}
+        if i + 1 < length:
+            phi_args[block]['x'].append(('q{}'.format(i), 'y'))
+    return pred, phi_args, phi_dests
+
+
+def time_prune(prune, length, reps):
+    best = float('inf')
+    for _ in range(reps):
+        pred, phi_args, phi_dests = phi_chain(length)
+        start = time.perf_counter()
+        prune(pred, phi_args, phi_dests)
+        best = min(best, time.perf_counter() - start)
+        assert not any(phi_dests.values())
+    return best
+
+
+def report(name, progs, reps):
+    print(name)
+    for mode in to_ssa.MODES:
+        total, elapsed = Counter(), 0.0
+        for data in progs:
+            stats, t = convert(data, mode, reps)
+            total.update(stats)
+            elapsed += t
+        print('  {:>8}: {:6} placed, {:6} left, {:8.2f} ms'.format(
+            mode, total['placed'], total['phis'], elapsed * 1e3,
+        ))
+
+
+def bench(instrs, chain, reps):
+    progs = []
+    for path in sorted(glob.glob(os.path.join(BENCHMARKS, '*.bril'))):
+        with open(path) as f:
+            progs.append(json.loads(briltxt.parse_bril(f.read())))
+    report('{} programs in benchmarks/'.format(len(progs)), progs, reps)
+    report('generated program with {} instructions'.format(instrs),
+           [gen.gen_prog(instrs=instrs)], reps)
+
+    print('pruning a chain of {} phi-nodes'.format(chain))
+    for name, prune in [('rescan', rescan_prune),
+                        ('worklist', to_ssa.prune_phis)]:
+        print('  {:>8}: {:8.2f} ms'.format(
+            name, time_prune(prune, chain, reps) * 1e3,
+        ))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--instrs', 5000), gen._opt(args, '--chain', 2000),
+          gen._opt(args, '--reps', 3))
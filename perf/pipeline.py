@@ -0,0 +1,130 @@
+"""Compare running an optimization pipeline as a chain of example
+scripts, connected by pipes, against running it in one process with
+`examples/opt.py`:
+
+    $ python pipeline.py --instrs 2000 --reps 3
+
+The first number is what `brench` pays for every benchmark on small
+programs (mostly process startup and JSON), and the second is what it
+pays on big ones. Then, in a single process, it compares the pipeline
+with and without caching analyses between passes and counts how many
+times each analysis is computed. Last, it runs `opt.py --jobs N` on a
+program with many functions (`--funcs`) for a few values of N, up to
+the number of CPUs.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import gen
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                        'examples')
+sys.path.insert(0, EXAMPLES)
+
+import analyses  # noqa: E402
+import ir  # noqa: E402
+import opt  # noqa: E402
+
+PIPELINE = 'to_ssa,lvn(pcf),tdce+,from_ssa'
+CACHE_PIPELINE = 'to_ssa,lvn(pcf),from_ssa,to_ssa,from_ssa'
+CHAIN = [
+    ['to_ssa.py'],
+    ['lvn.py', '-p', '-c', '-f'],
+    ['tdce.py', 'tdce+'],
+    ['from_ssa.py'],
+]
+
+
+def run_chain(js):
+    for args in CHAIN:
+        js = subprocess.run(
+            [sys.executable] + args, input=js, cwd=EXAMPLES,
+            stdout=subprocess.PIPE, universal_newlines=True, check=True,
+        ).stdout
+    return js
+
+
+def run_opt(js, jobs=1):
+    return subprocess.run(
+        [sys.executable, 'opt.py', '--jobs', str(jobs), PIPELINE],
+        input=js, cwd=EXAMPLES, stdout=subprocess.PIPE,
+        universal_newlines=True, check=True,
+    ).stdout
+
+
+class NoCache(analyses.AnalysisManager):
+    """An analysis manager that forgets everything after every pass.
+    """
+    def invalidate(self, func, preserve=()):
+        super(NoCache, self).invalidate(func)
+
+
+def run_in_process(js, am):
+    prog = ir.from_json(json.loads(js))
+    pipeline = opt.parse_pipeline(CACHE_PIPELINE)
+    opt.run_pipeline(prog, pipeline, am)
+    return prog.to_json()
+
+
+def bench_cache(js, reps):
+    for name, make in [('no cache', NoCache),
+                       ('cache', analyses.AnalysisManager)]:
+        best = float('inf')
+        for _ in range(reps):
+            am = make()
+            start = time.perf_counter()
+            run_in_process(js, am)
+            best = min(best, time.perf_counter() - start)
+        print('{:>10}: {:7.3f} s  ({})'.format(name, best, ', '.join(
+            '{} {}'.format(a, n) for a, n in sorted(am.counts.items())
+        )))
+
+
+def measure(func, js, reps):
+    best = float('inf')
+    for _ in range(reps):
+        start = time.perf_counter()
+        func(js)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_jobs(funcs, instrs, reps):
+    js = json.dumps(gen.gen_prog(funcs=funcs, instrs=instrs))
+    serial = run_opt(js)
+    jobs = 1
+    while True:
+        assert run_opt(js, jobs) == serial
+        t = measure(lambda js: run_opt(js, jobs), js, reps)
+        print('{:>8} jobs: {:7.3f} s'.format(jobs, t))
+        if jobs >= (os.cpu_count() or 1):
+            break
+        jobs = min(jobs * 2, os.cpu_count())
+
+
+def bench(instrs, funcs, reps):
+    for size in (10, instrs):
+        js = json.dumps(gen.gen_prog(instrs=size))
+        assert run_chain(js) == run_opt(js)
+        chain = measure(run_chain, js, reps)
+        in_process = measure(run_opt, js, reps)
+        print('{:>8} instructions: chain {:7.3f} s, opt.py {:7.3f} s '
+              '({:.1f}x faster)'.format(
+                  size, chain, in_process, chain / in_process,
+              ))
+
+    print(CACHE_PIPELINE)
+    bench_cache(js, reps)
+
+    print('{} with {} functions'.format(PIPELINE, funcs))
+    bench_jobs(funcs, instrs * 10, reps)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--instrs', 2000), gen._opt(args, '--funcs', 200),
+          gen._opt(args, '--reps', 3))
@@ -0,0 +1,57 @@
+"""Measure the throughput of the text format printer (`bril2txt`).
+
+Compares printing one line at a time with `print` (using
+`briltxt.print_instr` and `print_label`) against the buffered
+`briltxt.Printer`, writing to a file:
+
+    $ python print.py --instrs 2000000
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bril-txt'))
+
+import briltxt  # noqa: E402
+import gen  # noqa: E402
+
+
+def print_lines(prog):
+    for func in prog['functions']:
+        print(briltxt.func_header(func))
+        for instr in func['instrs']:
+            if 'label' in instr:
+                briltxt.print_label(instr)
+            else:
+                briltxt.print_instr(instr)
+        print('}')
+
+
+def bench(funcs, instrs):
+    prog = gen.gen_prog(funcs, instrs)
+    count = gen.count_instrs(prog)
+    print('{} functions, {} instructions'.format(funcs, count))
+
+    with tempfile.TemporaryFile('w+') as f:
+        for name, func in [
+            ('print', lambda: print_lines(prog)),
+            ('Printer', lambda: briltxt.write_prog(prog, sys.stdout)),
+        ]:
+            f.seek(0)
+            f.truncate()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(f):
+                func()
+                f.flush()
+            elapsed = time.perf_counter() - start
+            print('{:>8}: {:7.3f} s  {:10.0f} instrs/s'.format(
+                name, elapsed, count / elapsed,
+            ))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--funcs', 10), gen._opt(args, '--instrs', 1000000))
@@ -0,0 +1,148 @@
+"""Check the startup cost of Bril's Python command-line tools.
+
+Every stage of a `brench` pipeline is a fresh Python process, so the
+time each tool spends importing modules is paid once per stage, per
+benchmark, per run. This script runs each tool on a tiny program under
+`python -X importtime` and adds up the time spent importing everything
+after `site` (the interpreter's own startup, which every Python process
+pays for). Import times depend a lot on the machine, so they are
+compared to the time for `import json` (which every tool needs anyway)
+on the same machine, and each tool's budget in `BUDGETS` is a multiple
+of that baseline:
+
+    $ python startup.py
+
+It exits with an error if any tool is over budget. Pass `-v` to list the
+most expensive imports for each tool.
+"""
+
+import os
+import subprocess
+import sys
+
+BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+EXAMPLES = os.path.join(BASE, 'examples')
+
+PROGRAM_TXT = """
+@main {
+  v: int = const 4;
+  print v;
+}
+"""
+
+PROGRAM_JSON = """
+{"functions": [{"name": "main", "instrs": [
+  {"op": "const", "dest": "v", "type": "int", "value": 4},
+  {"op": "print", "args": ["v"]}
+]}]}
+"""
+
+# The tools to measure: a name, the command (in `examples/`), and the
+# input.
+TOOLS = [
+    ('bril2json', ['-c', 'import briltxt; briltxt.bril2json()'],
+     PROGRAM_TXT),
+    ('bril2txt', ['-c', 'import briltxt; briltxt.bril2txt()'],
+     PROGRAM_JSON),
+    ('brench --help', [os.path.join(BASE, 'brench', 'brench.py'), '--help'],
+     ''),
+    ('cfg_dot.py -v', ['cfg_dot.py', '-v'], PROGRAM_JSON),
+    ('defuse.py', ['defuse.py'], PROGRAM_JSON),
+    ('df.py live', ['df.py', 'live'], PROGRAM_JSON),
+    ('dom.py', ['dom.py'], PROGRAM_JSON),
+    ('form_blocks.py', ['form_blocks.py'], PROGRAM_JSON),
+    ('from_ssa.py', ['from_ssa.py'], PROGRAM_JSON),
+    ('is_ssa.py', ['is_ssa.py'], PROGRAM_JSON),
+    ('loops.py', ['loops.py'], PROGRAM_JSON),
+    ('lvn.py', ['lvn.py', '-p', '-c', '-f'], PROGRAM_JSON),
+    ('opt.py', ['opt.py', 'to_ssa,lvn(pcf),tdce+,from_ssa'], PROGRAM_JSON),
+    ('tdce.py', ['tdce.py', 'tdce+'], PROGRAM_JSON),
+    ('to_ssa.py', ['to_ssa.py'], PROGRAM_JSON),
+]
+
+# The baseline: a process that imports only `json`.
+BASELINE = ['-c', 'import json']
+
+# Import time budgets, as multiples of the baseline's import time. The
+# parser needs Lark, which is much more expensive to import than anything
+# else; every other tool should get by with the standard library's basics
+# (like `json`). The budgets are loose, so that only a new heavy import
+# goes over, not the noise in the measurements.
+DEFAULT_BUDGET = 3
+BUDGETS = {
+    'bril2json': 10,
+    'brench --help': 10,
+}
+
+REPS = 5
+
+
+def import_times(cmd, stdin):
+    """Run a Python command with `-X importtime` and get a list of
+    (cumulative microseconds, module) pairs for the top-level imports
+    that happen after `site`.
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # Measure cached bytecode.
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + cmd,
+        input=stdin, cwd=EXAMPLES, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True,
+    )
+
+    out = []
+    after_site = False
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip() == 'cumulative':
+            continue  # Header.
+        if name.startswith('  '):
+            continue  # Nested import.
+        name = name.strip()
+        if after_site:
+            out.append((int(cumulative), name))
+        elif name == 'site':
+            after_site = True
+    return out
+
+
+def best_import_times(cmd, stdin):
+    """Get the fastest of `REPS` runs of `import_times`, as a pair of the
+    total milliseconds and the list of imports.
+    """
+    import_times(cmd, stdin)  # Warm up the bytecode cache.
+    best = None
+    for _ in range(REPS):
+        times = import_times(cmd, stdin)
+        total = sum(t for t, _ in times) / 1000
+        if best is None or total < best[0]:
+            best = total, times
+    return best
+
+
+def startup(verbose=False):
+    baseline, _ = best_import_times(BASELINE, '')
+    print('{:>16}: {:6.1f} ms'.format('import json', baseline))
+
+    over = []
+    for name, cmd, stdin in TOOLS:
+        total, times = best_import_times(cmd, stdin)
+        budget = BUDGETS.get(name, DEFAULT_BUDGET)
+        status = 'ok' if total <= budget * baseline else 'OVER BUDGET'
+        if total > budget * baseline:
+            over.append(name)
+        print('{:>16}: {:6.1f} ms  {:4.1f}x  (budget {}x)  {}'.format(
+            name, total, total / baseline, budget, status,
+        ))
+        if verbose:
+            for t, mod in sorted(times, reverse=True)[:5]:
+                print('{:>24} {:6.1f} ms'.format(mod, t / 1000))
+
+    return not over
+
+
+if __name__ == '__main__':
+    sys.exit(0 if startup('-v' in sys.argv[1:]) else 1)
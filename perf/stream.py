@@ -0,0 +1,81 @@
+"""Compare the peak memory use of `bril2json` and `bril2txt` in their
+whole-program and streaming (`--stream`) modes:
+
+    $ python stream.py --funcs 100 --instrs 200000
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bril-txt'))
+
+import briltxt  # noqa: E402
+import gen  # noqa: E402
+
+
+class NullWriter:
+    """A text stream that discards its output.
+    """
+    def write(self, s):
+        return len(s)
+
+
+def measure(func, data):
+    """Run `func` on a stream containing `data` and return its running
+    time and peak traced memory (not counting the input).
+    """
+    f = io.StringIO(data)
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(f)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench(funcs, instrs):
+    prog = gen.gen_prog(funcs, instrs)
+    js = json.dumps(prog, indent=2, sort_keys=True)
+    with contextlib.redirect_stdout(io.StringIO()) as f:
+        briltxt.print_prog(prog)
+    txt = f.getvalue()
+    del prog
+
+    def to_json_whole(f):
+        NullWriter().write(briltxt.parse_bril(f.read()))
+
+    def to_json_stream(f):
+        briltxt.write_json(briltxt.parse_funcs(f), NullWriter())
+
+    def to_txt_whole(f):
+        json.load(f)
+
+    def to_txt_stream(f):
+        for func in briltxt.FuncReader(f):
+            pass
+
+    briltxt.get_parser()  # Exclude parser construction.
+    print('{} functions, {} text bytes, {} JSON bytes'.format(
+        funcs, len(txt), len(js),
+    ))
+    for name, func, data in [
+        ('bril2json', to_json_whole, txt),
+        ('bril2json --stream', to_json_stream, txt),
+        ('bril2txt (load)', to_txt_whole, js),
+        ('bril2txt --stream (load)', to_txt_stream, js),
+    ]:
+        elapsed, peak = measure(func, data)
+        print('{:>25}: {:7.3f} s  {:8.1f} MiB peak'.format(
+            name, elapsed, peak / 2 ** 20,
+        ))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    bench(gen._opt(args, '--funcs', 100), gen._opt(args, '--instrs', 100000))